@@ -0,0 +1,237 @@
+"""Rerun-latency benchmarks for streamlit_app.py
+
+Drives the app headlessly with ``streamlit.testing`` AppTest against the local
+Open-Meteo stub (tools/openmeteo_stub.py), so results do not depend on the
+network. Scenarios:
+
+- ``cold_start``       empty forecast and figure caches, fresh session
+- ``warm_rerun``       forecast cached, figures rebuilt (figure cache cleared)
+- ``cache_hit_rerun``  forecast and figures cached, same city
+- ``city_switch``      selecting a different catalog city each run
+
+Per-stage timings (figure builds and ``st.plotly_chart`` per chart, fetch,
+styles) come from weather_hub.metrics. Memory per session is the traced heap
+growth per additional AppTest session. Results are written as sorted JSON so
+two runs can be diffed; ``--baseline`` fails the run on regressions::
+
+    python -m benchmarks.bench_reruns --runs 20 --output bench.json
+    python -m benchmarks.bench_reruns --baseline bench.json --threshold 0.25
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "streamlit_app.py")
+SCHEMA = 1
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(seconds):
+    """Latency summary in milliseconds"""
+    ms = [s * 1000 for s in seconds]
+    return {
+        "runs": len(ms),
+        "mean_ms": round(sum(ms) / len(ms), 3),
+        "p50_ms": round(_percentile(ms, 0.5), 3),
+        "p90_ms": round(_percentile(ms, 0.9), 3),
+        "p99_ms": round(_percentile(ms, 0.99), 3),
+        "max_ms": round(max(ms), 3),
+    }
+
+
+class Bench:
+    """AppTest sessions plus handles on the app's process-wide caches"""
+
+    def __init__(self, timeout):
+        # Imported here so OPEN_METEO_BASE_URL is set before weather_hub loads
+        from streamlit.testing.v1 import AppTest
+        from weather_hub import metrics
+        from weather_hub.cache import forecast_cache
+        from weather_hub.figures import figure_cache, variant_cache
+
+        self.AppTest = AppTest
+        self.metrics = metrics
+        self.forecast_cache = forecast_cache
+        self.figure_cache = figure_cache
+        self.variant_cache = variant_cache
+        self.timeout = timeout
+
+    def session(self):
+        return self.AppTest.from_file(APP, default_timeout=self.timeout)
+
+    @staticmethod
+    def run(at):
+        start = time.perf_counter()
+        at.run()
+        elapsed = time.perf_counter() - start
+        if at.exception:
+            raise RuntimeError(f"App raised: {at.exception[0].message}")
+        return elapsed
+
+    def cities(self, at):
+        return at.selectbox(key="city_selector").options
+
+    def stages(self):
+        """Stage timings recorded since the last registry reset"""
+        stages = {}
+        for summary in self.metrics.registry.snapshot()["summaries"]:
+            if summary["name"] != "weather_hub_stage_seconds":
+                continue
+            labels = summary["labels"]
+            name = labels["stage"] + (f":{labels['figure']}" if "figure" in labels else "")
+            stages[name] = {
+                "count": summary["count"],
+                "mean_ms": round(summary["sum"] / summary["count"] * 1000, 3),
+                "p50_ms": round(summary["p50"] * 1000, 3),
+                "p99_ms": round(summary["p99"] * 1000, 3),
+            }
+        return dict(sorted(stages.items()))
+
+
+def scenario(bench, runs, prepare, step):
+    """Time ``runs`` reruns; ``prepare`` runs untimed before each ``step``"""
+    bench.metrics.registry.reset()
+    seconds = []
+    for i in range(runs):
+        at = prepare(i)
+        seconds.append(step(at, i))
+    return {**summarize(seconds), "stages": bench.stages()}
+
+
+def run_benchmarks(bench, runs, sessions):
+    results = {}
+
+    def cold(i):
+        bench.forecast_cache.clear()
+        bench.figure_cache.clear()
+        bench.variant_cache.clear()
+        return bench.session()
+
+    results["cold_start"] = scenario(bench, runs, cold, lambda at, i: bench.run(at))
+
+    warm = bench.session()
+    bench.run(warm)
+
+    def drop_figures(i):
+        bench.figure_cache.clear()
+        bench.variant_cache.clear()
+        return warm
+
+    results["warm_rerun"] = scenario(bench, runs, drop_figures, lambda at, i: bench.run(at))
+    results["cache_hit_rerun"] = scenario(bench, runs, lambda i: warm, lambda at, i: bench.run(at))
+
+    cities = bench.cities(warm)
+
+    def switch(at, i):
+        at.selectbox(key="city_selector").select(cities[(i + 1) % len(cities)])
+        return bench.run(at)
+
+    results["city_switch"] = scenario(bench, runs, lambda i: warm, switch)
+    results["memory"] = measure_sessions(bench, sessions)
+    return results
+
+
+def measure_sessions(bench, sessions):
+    """Traced heap growth per additional live session, after caches are warm"""
+    bench.run(bench.session())
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    live = []
+    for _ in range(sessions):
+        at = bench.session()
+        bench.run(at)
+        live.append(at)
+    gc.collect()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "sessions": sessions,
+        "per_session_kib": round((after - before) / sessions / 1024, 1),
+        "peak_kib": round((peak - before) / 1024, 1),
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, threshold, floor_ms):
+    """Scenarios whose p50 grew more than ``threshold`` (and ``floor_ms``)"""
+    regressions = []
+    for name, result in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before or "p50_ms" not in result:
+            continue
+        limit = before["p50_ms"] * (1 + threshold)
+        if result["p50_ms"] > limit and result["p50_ms"] - before["p50_ms"] > floor_ms:
+            regressions.append((name, before["p50_ms"], result["p50_ms"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rerun-latency benchmarks for streamlit_app.py")
+    parser.add_argument("--runs", type=int, default=10, help="timed reruns per scenario")
+    parser.add_argument("--sessions", type=int, default=5, help="sessions for the memory measurement")
+    parser.add_argument("--timeout", type=float, default=60.0, help="AppTest timeout per run (s)")
+    parser.add_argument("--upstream-latency-ms", type=float, default=0.0, help="stub latency")
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative p50 growth")
+    parser.add_argument("--floor-ms", type=float, default=2.0, help="ignore p50 growth below this")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    from tools.openmeteo_stub import StubServer
+
+    with StubServer(latency_ms=args.upstream_latency_ms) as stub:
+        os.environ["OPEN_METEO_BASE_URL"] = stub.base_url
+        bench = Bench(args.timeout)
+        scenarios = run_benchmarks(bench, args.runs, args.sessions)
+        upstream_requests = stub.stub.stats["requests"]
+
+    results = {
+        "schema": SCHEMA,
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "runs": args.runs,
+        "upstream_requests": upstream_requests,
+        "scenarios": {k: v for k, v in scenarios.items() if k != "memory"},
+        "memory": scenarios["memory"],
+    }
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        regressions = compare(results, baseline, args.threshold, args.floor_ms)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: p50 {before:.1f} ms -> {after:.1f} ms", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
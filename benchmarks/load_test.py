@@ -0,0 +1,311 @@
+"""Concurrent-session load test for a running Streamlit dashboard
+
+Each simulated session speaks the Streamlit websocket protocol like a browser
+tab: it connects to ``/_stcore/stream``, runs the script, then alternates
+think time with either a city switch or an idle rerun. Time-to-render is
+measured from sending the rerun request to receiving ``script_finished``.
+
+Reports throughput, p50/p95/p99 time-to-render per action, bytes pushed per
+rerun, upstream calls (via the stub's ``/__stats``) and server RSS. With
+``--launch`` the harness starts the stub and ``streamlit run`` itself::
+
+    python -m benchmarks.load_test --launch --sessions 25 --duration 60
+    python -m benchmarks.load_test --url http://127.0.0.1:8501 --server-pid 1234 \\
+        --stub-url http://127.0.0.1:8765 --sessions 50
+
+Needs tornado (a dependency of Streamlit) for the websocket client.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.Selectbox_pb2 import Selectbox
+from tornado.httpclient import HTTPRequest
+from tornado.websocket import websocket_connect
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "streamlit_app.py")
+CITY_KEY = "city_selector"
+# Newer Streamlit releases send selectbox values as the option string,
+# older ones as the option index
+SELECTBOX_SENDS_STRING = "raw_value" in Selectbox.DESCRIPTOR.fields_by_name
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else float("nan")
+
+
+def summarize(seconds):
+    ms = [s * 1000 for s in seconds]
+    return {
+        "count": len(ms),
+        "p50_ms": round(_percentile(ms, 0.5), 1),
+        "p95_ms": round(_percentile(ms, 0.95), 1),
+        "p99_ms": round(_percentile(ms, 0.99), 1),
+        "max_ms": round(max(ms), 1) if ms else float("nan"),
+    }
+
+
+def rss_bytes(pid):
+    """Resident set size of ``pid`` from /proc (Linux), or None"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def stub_requests(stub_url):
+    if not stub_url:
+        return None
+    with urllib.request.urlopen(f"{stub_url}/__stats", timeout=5) as response:
+        return json.load(response).get("requests", 0)
+
+
+class Results:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.bytes = []
+        self.errors = defaultdict(int)
+
+
+class Session:
+    """One simulated browser tab"""
+
+    def __init__(self, url, results, rng, think_ms, switch_prob):
+        self.url = url.replace("http", "ws", 1).rstrip("/") + "/_stcore/stream"
+        self.results = results
+        self.rng = rng
+        self.think_ms = think_ms
+        self.switch_prob = switch_prob
+        self.ws = None
+        self.widget_id = None
+        self.options = []
+        self.city = None
+
+    async def connect(self):
+        request = HTTPRequest(self.url, headers={"Sec-WebSocket-Protocol": "streamlit"})
+        self.ws = await websocket_connect(request, max_message_size=64 * 1024 * 1024)
+
+    def _rerun_message(self):
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = ""
+        if self.widget_id is not None and self.city is not None:
+            state = msg.rerun_script.widget_states.widgets.add()
+            state.id = self.widget_id
+            if SELECTBOX_SENDS_STRING:
+                state.string_value = self.options[self.city]
+            else:
+                state.int_value = self.city
+        return msg.SerializeToString()
+
+    async def rerun(self, action):
+        start = time.perf_counter()
+        await self.ws.write_message(self._rerun_message(), binary=True)
+        pushed = 0
+        while True:
+            data = await self.ws.read_message()
+            if data is None:
+                raise ConnectionError("websocket closed by server")
+            pushed += len(data)
+            msg = ForwardMsg()
+            msg.ParseFromString(data)
+            kind = msg.WhichOneof("type")
+            if kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                element = msg.delta.new_element
+                element_type = element.WhichOneof("type")
+                if element_type == "selectbox" and element.selectbox.id.endswith(CITY_KEY):
+                    self.widget_id = element.selectbox.id
+                    self.options = list(element.selectbox.options)
+                elif element_type == "exception":
+                    self.results.errors["app_exception"] += 1
+            elif kind == "script_finished":
+                if msg.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                if msg.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    self.results.errors["compile_error"] += 1
+                break
+        self.results.latencies[action].append(time.perf_counter() - start)
+        self.results.bytes.append(pushed)
+
+    async def run(self, deadline):
+        try:
+            await self.connect()
+            await self.rerun("initial")
+            if self.options:
+                self.city = 0
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.rng.expovariate(1000.0 / self.think_ms) if self.think_ms else 0)
+                if time.monotonic() >= deadline:
+                    break
+                if self.options and self.rng.random() < self.switch_prob:
+                    self.city = self.rng.randrange(len(self.options))
+                    await self.rerun("city_switch")
+                else:
+                    await self.rerun("idle_rerun")
+        except Exception as e:
+            self.results.errors[type(e).__name__] += 1
+        finally:
+            if self.ws is not None:
+                self.ws.close()
+
+
+async def sample_rss(pid, samples, stop):
+    while not stop.is_set():
+        value = rss_bytes(pid)
+        if value is not None:
+            samples.append(value)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_load(args):
+    results = Results()
+    rng = random.Random(args.seed)
+    deadline = time.monotonic() + args.ramp_up + args.duration
+    sessions = [
+        Session(args.url, results, random.Random(rng.random()), args.think_ms, args.switch_prob)
+        for _ in range(args.sessions)
+    ]
+    rss_samples, stop = [], asyncio.Event()
+    sampler = asyncio.ensure_future(sample_rss(args.server_pid, rss_samples, stop)) if args.server_pid else None
+
+    async def start(session, delay):
+        await asyncio.sleep(delay)
+        await session.run(deadline)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        start(session, args.ramp_up * i / max(1, len(sessions))) for i, session in enumerate(sessions)
+    ))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    if sampler is not None:
+        await sampler
+    return results, elapsed, rss_samples
+
+
+def wait_for_health(url, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/_stcore/health", timeout=2) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.5)
+    raise TimeoutError(f"Streamlit did not become healthy at {url}")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def launch(args):
+    """Start the stub and a Streamlit server; returns a cleanup callable"""
+    sys.path.insert(0, ROOT)
+    from tools.openmeteo_stub import StubServer
+
+    stub = StubServer(latency_ms=args.upstream_latency_ms, jitter_ms=args.upstream_jitter_ms).start()
+    port = _free_port()
+    env = dict(os.environ, OPEN_METEO_BASE_URL=stub.base_url)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP, "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    args.url = f"http://127.0.0.1:{port}"
+    args.server_pid = server.pid
+    args.stub_url = stub.base_url
+    try:
+        wait_for_health(args.url)
+    except Exception:
+        server.terminate()
+        stub.stop()
+        raise
+
+    def cleanup():
+        server.terminate()
+        server.wait(timeout=30)
+        stub.stop()
+
+    return cleanup
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the dashboard")
+    parser.add_argument("--url", default="http://127.0.0.1:8501", help="running app base URL")
+    parser.add_argument("--launch", action="store_true", help="start the stub and the app locally")
+    parser.add_argument("--server-pid", type=int, help="app server PID for RSS sampling")
+    parser.add_argument("--stub-url", help="stub base URL for upstream call counts")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds after ramp-up")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="seconds to open all sessions")
+    parser.add_argument("--think-ms", type=float, default=2000.0, help="mean think time")
+    parser.add_argument("--switch-prob", type=float, default=0.3, help="chance an action switches city")
+    parser.add_argument("--upstream-latency-ms", type=float, default=80.0, help="--launch stub latency")
+    parser.add_argument("--upstream-jitter-ms", type=float, default=40.0, help="--launch stub jitter")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    cleanup = launch(args) if args.launch else None
+    try:
+        upstream_before = stub_requests(args.stub_url)
+        rss_before = rss_bytes(args.server_pid) if args.server_pid else None
+        results, elapsed, rss_samples = asyncio.run(run_load(args))
+        upstream_after = stub_requests(args.stub_url)
+    finally:
+        if cleanup is not None:
+            cleanup()
+
+    all_latencies = [s for values in results.latencies.values() for s in values]
+    report = {
+        "sessions": args.sessions,
+        "duration_s": round(elapsed, 2),
+        "reruns": len(all_latencies),
+        "throughput_rps": round(len(all_latencies) / elapsed, 2) if elapsed else 0.0,
+        "time_to_render": {
+            "all": summarize(all_latencies),
+            **{action: summarize(values) for action, values in sorted(results.latencies.items())},
+        },
+        "bytes_per_rerun": round(sum(results.bytes) / len(results.bytes)) if results.bytes else 0,
+        "upstream_calls": (
+            upstream_after - upstream_before if upstream_before is not None else None
+        ),
+        "server_rss_mib": {
+            "start": round(rss_before / 2**20, 1) if rss_before else None,
+            "peak": round(max(rss_samples) / 2**20, 1) if rss_samples else None,
+            "end": round(rss_samples[-1] / 2**20, 1) if rss_samples else None,
+        },
+        "errors": dict(results.errors),
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    print(text)
+    return 1 if results.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
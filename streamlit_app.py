@@ -1,13 +1,26 @@
 import streamlit as st
-import requests
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
 import time
+import functools
 from datetime import datetime, timedelta
 import json
+import html
+
+from weather_hub import config
+from weather_hub.cache import coord_key, forecast_cache
+from weather_hub.figures import figure_cache, variant_cache
+from weather_hub.downsample import downsample
+from weather_hub.forecast import FORECAST_DAYS, PAST_DAYS, get_current_entry, get_forecast_entry
+from weather_hub import insights
+from weather_hub.insights import Rule
+from weather_hub.sources import get_dataset_entry
+from weather_hub.metrics import current_spans, registry, rerun, span
+from weather_hub.requirements import Requirement, combine
+from weather_hub.warmer import RefreshScheduler, popularity
 
 # ========================================
 # PAGE CONFIGURATION & THEME
@@ -22,7 +35,7 @@ st.set_page_config(
 # ========================================
 # ADVANCED CSS STYLING WITH ANIMATIONS
 # ========================================
-st.markdown("""
+GLOBAL_CSS = """
 <style>
     /* Import Google Fonts */
     @import url('https://fonts.googleapis.com/css2?family=Orbitron:wght@400;700;900&family=Poppins:wght@300;400;600;700&display=swap');
@@ -261,18 +274,18 @@ st.markdown("""
         background: var(--secondary-gradient);
     }
 </style>
-""", unsafe_allow_html=True)
+"""
 
-st.markdown("""
+BACKGROUND_CSS = """
 <style>
 html, body { background:#070B1A; }
 .stApp { background: transparent !important; }
 .block-container { position: relative; z-index: 1; }
 #bg3d { position: fixed; inset: 0; z-index: 0; pointer-events: none; }
 </style>
-""", unsafe_allow_html=True)
+"""
 
-st.html("""
+STARFIELD_HTML = """
 <canvas id=\"bg3d\"></canvas>
 <script>
 (function(){
@@ -341,7 +354,7 @@ st.html("""
   resize(); init(); step();
 })();
 </script>
-""")
+"""
 
 # ========================================
 # WORLD CITIES DATABASE
@@ -387,40 +400,107 @@ WEATHER_CONDITIONS = {
     96: ("⛈️", "Thunderstorm with Hail", "#9400D3"),
 }
 
+# ========================================
+# INSIGHT RULES
+# ========================================
+# Checked over every hour (or day) of the forecast on each rerun; the first
+# matching run of each rule is shown, in this order
+INSIGHT_RULES = (
+    Rule("Heat Alert", "🔥", "hourly", "temperature_2m", "temperature", ">", 30, "°C", 2,
+         "Very hot conditions! Stay hydrated and seek shade."),
+    Rule("Cold Alert", "🧊", "hourly", "temperature_2m", "temperature", "<", 0, "°C", 2,
+         "Freezing temperatures! Bundle up and watch for ice."),
+    Rule("Wind Warning", "💨", "hourly", "wind_speed_10m", "wind", ">", 30, "km/h", 1,
+         "Strong winds! Secure loose objects."),
+    Rule("Rain Alert", "☔", "hourly", "precipitation_probability", "rain chance", ">", 70, "%", 1,
+         "High chance of rain, carry an umbrella!"),
+    Rule("UV Warning", "☀️", "hourly", "uv_index", "UV", ">", 8, "", 1,
+         "Very high UV index! Use SPF 30+ sunscreen."),
+    Rule("UV Caution", "🕶️", "daily", "uv_index_max", "max UV", "between", (5, 8), "", 1,
+         "Moderate to high UV levels, wear sunglasses."),
+    Rule("Low Pressure", "📉", "hourly", "surface_pressure", "pressure", "<", 1000, "hPa", 3,
+         "Weather changes likely, possible storms approaching."),
+    Rule("High Pressure", "📈", "hourly", "surface_pressure", "pressure", ">", 1030, "hPa", 3,
+         "Stable, clear weather conditions expected."),
+    Rule("High Humidity", "💧", "hourly", "relative_humidity_2m", "humidity", ">", 80, "%", 3,
+         "Muggy conditions, feels warmer than actual temperature."),
+    Rule("Low Humidity", "🏜️", "hourly", "relative_humidity_2m", "humidity", "<", 30, "%", 3,
+         "Dry air, consider using moisturizer and staying hydrated."),
+    Rule("Perfect Weather", "🌿", "hourly", "temperature_2m", "temperature", "between", (20, 25), "°C", 3,
+         "Ideal temperature for outdoor activities!"),
+    Rule("Calm Conditions", "🍃", "hourly", "wind_speed_10m", "wind", "<", 5, "km/h", 3,
+         "Very light winds, perfect for outdoor dining."),
+    Rule("Dry Day", "☀️", "daily", "precipitation_probability_max", "rain chance", "<", 20, "%", 1,
+         "Low chance of rain, perfect for outdoor plans!"),
+)
+INSIGHT_DAYS = 7
+INSIGHT_MAX_ITEMS = 6
+
+# ========================================
+# PANEL DATA REQUIREMENTS
+# ========================================
+# What each panel reads; only the union of these is requested and cached
+PANEL_REQUIREMENTS = {
+    'conditions': [Requirement(current=(
+        'weather_code', 'temperature_2m', 'apparent_temperature', 'relative_humidity_2m',
+        'wind_speed_10m', 'wind_gusts_10m', 'surface_pressure'
+    ))],
+    'gauge': [Requirement(current=('temperature_2m', 'apparent_temperature'))],
+    'compass': [Requirement(current=('wind_speed_10m', 'wind_direction_10m'))],
+    'mood': [Requirement(current=('weather_code', 'temperature_2m', 'relative_humidity_2m'))],
+    'heatmap': [Requirement(
+        hourly=('temperature_2m', 'relative_humidity_2m', 'precipitation_probability', 'wind_speed_10m', 'uv_index'),
+        days=7
+    )],
+    'radar': [Requirement(daily=('precipitation_probability_max',), days=7)],
+    'timeline': [Requirement(
+        hourly=('temperature_2m', 'relative_humidity_2m', 'wind_speed_10m', 'uv_index'), hours=72
+    )],
+    'air_sea': [
+        Requirement('air_quality', current=('us_aqi',),
+                    hourly=('pm2_5', 'pm10', 'uv_index', 'uv_index_clear_sky'), hours=72),
+        Requirement('marine', hourly=('wave_height', 'swell_wave_height'), hours=72),
+    ],
+    'insights': [insights.requirement(INSIGHT_RULES, INSIGHT_DAYS)],
+}
+DATA_PLAN = combine(req for reqs in PANEL_REQUIREMENTS.values() for req in reqs)
+# Live mode polls only what the hero line and KPI cards show
+LIVE_SPEC = combine(PANEL_REQUIREMENTS['conditions'])['forecast']
+# The timeline's full-range mode, fetched only while a visitor has it on
+HISTORY_SPEC = combine([Requirement(
+    hourly=('temperature_2m', 'relative_humidity_2m', 'wind_speed_10m', 'uv_index'),
+    days=FORECAST_DAYS, past_days=PAST_DAYS
+)])['forecast']
+
 # ========================================
 # DATA FETCHING FUNCTIONS
 # ========================================
-@st.cache_data(ttl=600, show_spinner=False)
 def fetch_weather_data(lat, lon):
-    """Fetch comprehensive weather data from Open-Meteo API"""
-    url = "https://api.open-meteo.com/v1/forecast"
-    
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "current": [
-            "temperature_2m", "relative_humidity_2m", "apparent_temperature",
-            "weather_code", "surface_pressure", "wind_speed_10m",
-            "wind_direction_10m", "wind_gusts_10m"
-        ],
-        "hourly": [
-            "temperature_2m", "relative_humidity_2m", "precipitation_probability",
-            "precipitation", "wind_speed_10m", "wind_direction_10m",
-            "visibility", "uv_index", "weather_code"
-        ],
-        "daily": [
-            "weather_code", "temperature_2m_max", "temperature_2m_min",
-            "precipitation_sum", "precipitation_hours", "precipitation_probability_max",
-            "wind_speed_10m_max", "wind_gusts_10m_max", "uv_index_max"
-        ],
-        "timezone": "auto",
-        "past_days": 3,
-        "forecast_days": 14
-    }
-    
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    return response.json()
+    """Fetch what the panels declare from every source concurrently, stale-while-revalidate cached"""
+    popularity.record(lat, lon)
+    return get_dataset_entry(lat, lon, DATA_PLAN)
+
+def fetch_live_conditions(lat, lon):
+    """Current conditions only, re-fetched at most once per live interval"""
+    return get_current_entry(lat, lon, LIVE_SPEC)
+
+def fetch_timeline_history(lat, lon):
+    """Past and forecast hourly series over the whole horizon, stale-while-revalidate cached"""
+    return get_forecast_entry(lat, lon, HISTORY_SPEC)
+
+def format_age(seconds):
+    """Human-friendly age of a forecast, e.g. 'just now' or '12 min ago'"""
+    minutes = int(seconds // 60)
+    if minutes < 1:
+        return "just now"
+    if minutes < 60:
+        return f"{minutes} min ago"
+    return f"{minutes // 60} h {minutes % 60:02d} min ago"
+
+@st.cache_resource(show_spinner=False)
+def start_refresh_scheduler():
+    """Keep the city catalog and popular locations fresh in the background, once per process"""
+    return RefreshScheduler(coords=WORLD_CITIES.values(), plan=DATA_PLAN).start()
 
 # ========================================
 # VISUALIZATION FUNCTIONS
@@ -532,49 +612,42 @@ def create_wind_compass(wind_speed, wind_direction):
     
     return fig
 
-def create_hourly_forecast_heatmap(hourly_data):
-    """Create an animated hourly forecast heatmap"""
-    hours = pd.to_datetime(hourly_data['time'])
-    temps = hourly_data['temperature_2m']
-    humidity = hourly_data['relative_humidity_2m']
-    precip_prob = hourly_data['precipitation_probability']
-    
-    # Take next 48 hours
-    df = pd.DataFrame({
-        'hour': hours[:48],
-        'temperature': temps[:48],
-        'humidity': humidity[:48],
-        'precipitation': precip_prob[:48]
-    })
-    
-    # Create heatmap data
-    df['day'] = df['hour'].dt.strftime('%a %m/%d')
-    df['hour_only'] = df['hour'].dt.hour
-    
-    # Pivot for heatmap
-    heatmap_data = df.pivot_table(
-        values='temperature', 
-        index='day', 
-        columns='hour_only', 
-        fill_value=np.nan
-    )
+HEATMAP_VARIABLES = {
+    'temperature_2m': ('🌡️ Temperature', '°C', [
+        [0, '#440154'],
+        [0.2, '#3b528b'],
+        [0.4, '#21908d'],
+        [0.6, '#5dc863'],
+        [0.8, '#fde725'],
+        [1, '#ff6b6b']
+    ]),
+    'relative_humidity_2m': ('💧 Humidity', '%', 'Blues'),
+    'precipitation_probability': ('☔ Rain Chance', '%', 'Teal'),
+    'wind_speed_10m': ('💨 Wind', 'km/h', 'Viridis'),
+    'uv_index': ('☀️ UV Index', '', 'YlOrRd'),
+}
+HOUR_LABELS = [f"{h:02d}:00" for h in range(24)]
+
+def create_hourly_forecast_heatmap(cube, variable='temperature_2m', first_day=0, days=2):
+    """Day-by-hour heatmap of one hourly variable, sliced from a day/hour cube"""
+    label, unit, colorscale = HEATMAP_VARIABLES[variable]
+    rows = slice(first_day, first_day + days)
+    column = cube.values[:, :, cube.variables.index(variable)]
+    # One color range for the whole horizon, so colors compare across day ranges
+    finite = column[np.isfinite(column)]
+    zmin, zmax = (float(finite.min()), float(finite.max())) if finite.size else (None, None)
     
     fig = go.Figure(data=go.Heatmap(
-        z=heatmap_data.values,
-        x=[f"{h:02d}:00" for h in heatmap_data.columns],
-        y=heatmap_data.index,
-        colorscale=[
-            [0, '#440154'],
-            [0.2, '#3b528b'],
-            [0.4, '#21908d'],
-            [0.6, '#5dc863'],
-            [0.8, '#fde725'],
-            [1, '#ff6b6b']
-        ],
+        z=column[rows],
+        x=HOUR_LABELS,
+        y=list(cube.labels[rows]),
+        zmin=zmin,
+        zmax=zmax,
+        colorscale=colorscale,
         hoverongaps=False,
-        hovertemplate="<b>%{y}</b><br>Hour: %{x}<br>Temperature: %{z:.1f}°C<extra></extra>",
+        hovertemplate=f"<b>%{{y}}</b><br>Hour: %{{x}}<br>{label}: %{{z:.1f}}{unit}<extra></extra>",
         colorbar=dict(
-            title="Temperature (°C)",
+            title=f"{label} ({unit})" if unit else label,
             titlefont=dict(color='white'),
             tickfont=dict(color='white'),
             len=0.7
@@ -590,7 +663,8 @@ def create_hourly_forecast_heatmap(hourly_data):
         yaxis=dict(
             title="Date",
             tickfont=dict(color='white'),
-            titlefont=dict(color='white')
+            titlefont=dict(color='white'),
+            autorange='reversed'
         ),
         paper_bgcolor="rgba(0,0,0,0)",
         plot_bgcolor="rgba(0,0,0,0)",
@@ -600,13 +674,13 @@ def create_hourly_forecast_heatmap(hourly_data):
     
     return fig
 
-def create_precipitation_radar(daily_data):
+def create_precipitation_radar(frame):
     """Create precipitation probability radar chart"""
-    days = pd.to_datetime(daily_data['time'])[:7]
-    precip_prob = daily_data['precipitation_probability_max'][:7]
-    precip_sum = daily_data['precipitation_sum'][:7]
+    week = frame.daily_window(0, 7)
+    days = pd.DatetimeIndex(week.time)
+    precip_prob = week['precipitation_probability_max']
     
-    day_names = [day.strftime('%A') for day in days]
+    day_names = list(days.day_name())
     
     fig = go.Figure()
     
@@ -644,13 +718,14 @@ def create_precipitation_radar(daily_data):
     
     return fig
 
-def create_multi_metric_timeline(hourly_data):
+def create_multi_metric_timeline(frame):
     """Create multi-metric animated timeline"""
-    hours = pd.to_datetime(hourly_data['time'])[:72]  # Next 3 days
-    temps = hourly_data['temperature_2m'][:72]
-    humidity = hourly_data['relative_humidity_2m'][:72]
-    wind_speed = hourly_data['wind_speed_10m'][:72]
-    uv_index = hourly_data['uv_index'][:72]
+    window = frame.hourly_window(0, 72)  # Next 3 days
+    hours = window.time
+    temps = window['temperature_2m']
+    humidity = window['relative_humidity_2m']
+    wind_speed = window['wind_speed_10m']
+    uv_index = window['uv_index']
     
     fig = make_subplots(
         rows=2, cols=2,
@@ -748,6 +823,106 @@ def create_multi_metric_timeline(hourly_data):
     
     return fig
 
+TIMELINE_SERIES = [
+    (1, 1, 'temperature_2m', 'Temperature', '#ff6b6b', '°C'),
+    (1, 2, 'wind_speed_10m', 'Wind', '#4ecdc4', ' km/h'),
+    (2, 1, 'relative_humidity_2m', 'Humidity', '#45b7d1', '%'),
+    (2, 2, 'uv_index', 'UV Index', '#f7b733', ''),
+]
+
+def create_timeline_explorer(frame, start, stop, max_points):
+    """Timeline of any hourly range: WebGL lines with at most ``max_points`` per series
+
+    Ranges longer than ``max_points`` hours are reduced with
+    Largest-Triangle-Three-Buckets, which keeps peaks and troughs; shorter
+    (zoomed) ranges are drawn at full hourly resolution.
+    """
+    window = frame.hourly_range(start, stop)
+    
+    fig = make_subplots(
+        rows=2, cols=2,
+        subplot_titles=(
+            '🌡️ Temperature Trend', '💨 Wind Speed Pattern',
+            '💧 Humidity Levels', '☀️ UV Index'
+        ),
+        vertical_spacing=0.18,
+        horizontal_spacing=0.12
+    )
+    
+    for row, col, series, name, color, unit in TIMELINE_SERIES:
+        hours, values = downsample(window.time, window[series], max_points)
+        fig.add_trace(
+            go.Scattergl(
+                x=hours, y=values,
+                mode='lines',
+                line=dict(color=color, width=2),
+                name=name,
+                hovertemplate=f"<b>%{{x}}</b><br>{name}: %{{y:.1f}}{unit}<extra></extra>"
+            ),
+            row=row, col=col
+        )
+    
+    # Past and forecast meet at the current hour
+    now = frame.local_now().astype('datetime64[h]')
+    if start <= now < stop:
+        fig.add_vline(x=str(now), line=dict(color='rgba(255,255,255,0.5)', width=1, dash='dot'), row='all', col='all')
+    
+    fig.update_layout(
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        showlegend=False,
+        height=620,
+        margin=dict(l=60, r=60, t=40, b=60)
+    )
+    fig.update_xaxes(showgrid=True, gridcolor='rgba(255,255,255,0.1)', tickfont=dict(color='white'))
+    fig.update_yaxes(showgrid=True, gridcolor='rgba(255,255,255,0.1)', tickfont=dict(color='white'))
+    
+    return fig
+
+def create_air_and_sea_timeline(frame):
+    """Air quality, UV detail and sea state for the next 72 hours"""
+    window = frame.hourly_window(0, 72)
+    hours = window.time
+    
+    fig = make_subplots(
+        rows=1, cols=3,
+        subplot_titles=('🌫️ Particulates (μg/m³)', '☀️ UV vs Clear Sky', '🌊 Waves (m)'),
+        horizontal_spacing=0.08
+    )
+    
+    panels = [
+        (1, 'air_quality.pm2_5', 'PM2.5', '#c084fc'),
+        (1, 'air_quality.pm10', 'PM10', '#f472b6'),
+        (2, 'air_quality.uv_index', 'UV Index', '#f7b733'),
+        (2, 'air_quality.uv_index_clear_sky', 'UV Clear Sky', 'rgba(247, 183, 51, 0.45)'),
+        (3, 'marine.wave_height', 'Wave Height', '#38bdf8'),
+        (3, 'marine.swell_wave_height', 'Swell', '#0ea5e9'),
+    ]
+    for col, series, name, color in panels:
+        fig.add_trace(
+            go.Scatter(
+                x=hours, y=window[series],
+                mode='lines',
+                line=dict(color=color, width=3, shape='spline'),
+                name=name,
+                hovertemplate=f"<b>%{{x}}</b><br>{name}: %{{y:.1f}}<extra></extra>"
+            ),
+            row=1, col=col
+        )
+    
+    fig.update_layout(
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        showlegend=True,
+        legend=dict(orientation='h', y=-0.2, font=dict(color='white')),
+        height=340,
+        margin=dict(l=40, r=40, t=40, b=40)
+    )
+    fig.update_xaxes(showgrid=True, gridcolor='rgba(255,255,255,0.1)', tickfont=dict(color='white'))
+    fig.update_yaxes(showgrid=True, gridcolor='rgba(255,255,255,0.1)', tickfont=dict(color='white'))
+    
+    return fig
+
 def create_weather_mood_indicator(weather_code, temp, humidity):
     """Create a fun weather mood indicator"""
     icon, condition, color = WEATHER_CONDITIONS.get(weather_code, ("❓", "Unknown", "#888888"))
@@ -818,16 +993,337 @@ def create_weather_mood_indicator(weather_code, temp, humidity):
     
     return fig
 
+def cached_figure(kind, lat, lon, forecast, build, *args, variant=None, default=True):
+    """Build a chart once per (city, forecast version, kind, hour, variant); reruns reuse it
+
+    Pass ``default=False`` for a range the user picked: those go to the
+    smaller variant cache, so dragging a slider cannot evict default figures.
+    """
+    anchor = forecast.value.local_now().astype('datetime64[h]')
+    key = (coord_key(lat, lon), forecast.fetched_at, kind, anchor, variant)
+    
+    def timed_build():
+        with span("figure_build", figure=kind):
+            return build(*args)
+    
+    cache = figure_cache if default else variant_cache
+    return cache.get_or_build(key, timed_build)
+
+def heatmap_cube(lat, lon, forecast):
+    """The heatmap variables' day/hour cube, built once per forecast version
+
+    It is kept in the figure cache rather than on the shared frame, so the
+    forecast cache's memory budget stays accurate.
+    """
+    key = (coord_key(lat, lon), forecast.fetched_at, 'heatmap_cube')
+    return figure_cache.get_or_build(key, lambda: forecast.value.day_hour_cube(HEATMAP_VARIABLES))
+
+def render_chart(kind, fig):
+    """Send a figure to the browser, timing its serialization"""
+    with span("plotly_chart", figure=kind):
+        st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
+
+def render_debug_panel():
+    """Stage timings of this rerun plus process-wide latency percentiles, cache stats, counters and gauges"""
+    with st.expander("⏱️ Performance Debug Panel"):
+        spans = current_spans()
+        if spans:
+            stages = pd.DataFrame(spans).fillna('')
+            stages['ms'] = (stages.pop('seconds') * 1000).round(2)
+            st.markdown("**This rerun**")
+            st.dataframe(stages, use_container_width=True, hide_index=True)
+        snapshot = registry.snapshot()
+        if snapshot['summaries']:
+            summaries = pd.json_normalize(snapshot['summaries'])
+            for q in ('p50', 'p90', 'p99'):
+                summaries[q] = (summaries[q] * 1000).round(2)
+            st.markdown("**Process-wide latency (ms)**")
+            st.dataframe(summaries.drop(columns=['sum']), use_container_width=True, hide_index=True)
+        st.markdown("**Forecast cache**")
+        st.dataframe(pd.json_normalize([forecast_cache.stats()]), use_container_width=True, hide_index=True)
+        if snapshot['counters']:
+            st.markdown("**Counters**")
+            st.dataframe(pd.json_normalize(snapshot['counters']), use_container_width=True, hide_index=True)
+        if snapshot['gauges']:
+            st.markdown("**Gauges**")
+            st.dataframe(pd.json_normalize(snapshot['gauges']), use_container_width=True, hide_index=True)
+
+# ========================================
+# DASHBOARD PANELS
+# ========================================
+def panel(kind, run_every=None):
+    """Make a render function an independently rerunnable dashboard panel
+
+    The panel runs as an ``st.fragment``: a change to one of its own
+    widgets (or its ``run_every`` timer) re-executes only that function
+    instead of ``main()``, and only its elements are sent to the browser.
+    ``kind`` labels its panel-only reruns in the metrics. A panel's
+    arguments are its data dependencies; on a panel-only rerun Streamlit
+    passes those of the last full run, so it keeps showing the same
+    forecast version as the rest of the page.
+    """
+    def decorate(render):
+        @functools.wraps(render)
+        def run(*args, **kwargs):
+            # Recorded as its own run only when not part of a full rerun
+            with rerun(fragment=kind):
+                return render(*args, **kwargs)
+        return st.fragment(run, run_every=run_every)
+    return decorate
+
+def render_conditions(city_name, lat, lon, forecast, live=False):
+    """Hero line and KPI cards; in live mode from a fresh current-only fetch"""
+    live_error = None
+    if live:
+        try:
+            with span("live_fetch"):
+                forecast = fetch_live_conditions(lat, lon)
+        except Exception as e:
+            # Keep showing the page's data until the upstream answers again
+            live_error = e
+    current = forecast.value.current
+    weather_code = current['weather_code']
+    current_temp = current['temperature_2m']
+    feels_like = current['apparent_temperature']
+    humidity = current['relative_humidity_2m']
+    pressure = current['surface_pressure']
+    wind_speed = current['wind_speed_10m']
+    wind_gusts = current['wind_gusts_10m']
+    
+    icon, condition, color = WEATHER_CONDITIONS.get(weather_code, ("❓", "Unknown", "#888888"))
+    updated_at = datetime.fromtimestamp(forecast.fetched_at).strftime('%I:%M %p')
+    data_age = format_age(time.time() - forecast.fetched_at)
+    if live:
+        # A live tick re-fetches stale values on the spot; stale means it failed
+        data_age += " · live paused" if live_error or forecast.stale else " · 🔴 live"
+    elif forecast.stale:
+        data_age += " · refreshing"
+    
+    st.markdown(f"""
+    <div class="glow-card" style="text-align: center; margin: 2rem 0;">
+        <div class="weather-icon" style="color: {color}; margin-bottom: 1rem;">{icon}</div>
+        <h2 style="color: white; margin-bottom: 0.5rem; font-family: 'Orbitron';">{city_name}</h2>
+        <h3 style="color: {color}; margin: 0;">{condition}</h3>
+        <p style="color: #a8b2d1; margin-top: 1rem;">Last Updated: {updated_at} ({data_age})</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    metric_col1, metric_col2, metric_col3, metric_col4 = st.columns(4)
+    
+    with metric_col1:
+        st.markdown('<div class="glow-card floating">', unsafe_allow_html=True)
+        st.metric(
+            label="🌡️ Temperature",
+            value=f"{current_temp:.1f}°C",
+            delta=f"Feels {feels_like:.1f}°C"
+        )
+        st.markdown('</div>', unsafe_allow_html=True)
+    
+    with metric_col2:
+        st.markdown('<div class="glow-card floating">', unsafe_allow_html=True)
+        st.metric(
+            label="💧 Humidity",
+            value=f"{humidity:.0f}%",
+            delta="Optimal" if 40 <= humidity <= 60 else "High" if humidity > 60 else "Low"
+        )
+        st.markdown('</div>', unsafe_allow_html=True)
+    
+    with metric_col3:
+        st.markdown('<div class="glow-card floating">', unsafe_allow_html=True)
+        st.metric(
+            label="💨 Wind Speed",
+            value=f"{wind_speed:.1f} km/h",
+            delta=f"Gusts {wind_gusts:.1f} km/h"
+        )
+        st.markdown('</div>', unsafe_allow_html=True)
+    
+    with metric_col4:
+        st.markdown('<div class="glow-card floating">', unsafe_allow_html=True)
+        st.metric(
+            label="🌪️ Pressure",
+            value=f"{pressure:.0f} hPa",
+            delta="Normal" if 1013-20 <= pressure <= 1013+20 else "High" if pressure > 1013+20 else "Low"
+        )
+        st.markdown('</div>', unsafe_allow_html=True)
+
+conditions_panel = panel('conditions')(render_conditions)
+# Reruns on its own every live interval; nothing else on the page is rebuilt
+live_conditions_panel = panel('conditions', run_every=config.LIVE_INTERVAL)(render_conditions)
+
+@panel('gauge')
+def gauge_panel(lat, lon, forecast):
+    """Current and feels-like temperature gauge"""
+    current = forecast.value.current
+    st.markdown('<div class="glow-card">\n  <h3 style="margin-top:0;">🌡️ Temperature</h3>', unsafe_allow_html=True)
+    temp_gauge = cached_figure('gauge', lat, lon, forecast, create_temperature_gauge, current['temperature_2m'], current['apparent_temperature'])
+    render_chart('gauge', temp_gauge)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@panel('compass')
+def compass_panel(lat, lon, forecast):
+    """Current wind speed and direction"""
+    current = forecast.value.current
+    st.markdown('<div class="glow-card">\n  <h3 style="margin-top:0;">🧭 Wind Direction</h3>', unsafe_allow_html=True)
+    wind_compass = cached_figure('compass', lat, lon, forecast, create_wind_compass, current['wind_speed_10m'], current['wind_direction_10m'])
+    render_chart('compass', wind_compass)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@panel('mood')
+def mood_panel(lat, lon, forecast):
+    """Mood score of the current conditions"""
+    current = forecast.value.current
+    st.markdown('<div class="glow-card">\n  <h3 style="margin-top:0;">😊 Weather Mood</h3>', unsafe_allow_html=True)
+    mood_indicator = cached_figure('mood', lat, lon, forecast, create_weather_mood_indicator, current['weather_code'], current['temperature_2m'], current['relative_humidity_2m'])
+    render_chart('mood', mood_indicator)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@panel('heatmap')
+def heatmap_panel(lat, lon, forecast):
+    """Any hourly variable by day and hour, over a chosen range of days"""
+    cube = heatmap_cube(lat, lon, forecast)
+    st.markdown('<div class="glow-card">\n  <h3 style="margin-top:0;">🔥 Hourly Heatmap</h3>', unsafe_allow_html=True)
+    variable = st.radio(
+        "Variable",
+        options=list(HEATMAP_VARIABLES),
+        format_func=lambda name: HEATMAP_VARIABLES[name][0],
+        horizontal=True,
+        key='heatmap_variable',
+        label_visibility="collapsed"
+    )
+    default_days = (0, min(1, len(cube.labels) - 1))
+    first, last = default_days
+    if len(cube.labels) > 1:
+        first, last = st.select_slider(
+            "Days",
+            options=list(range(len(cube.labels))),
+            value=default_days,
+            format_func=lambda day: cube.labels[day],
+            key=f"heatmap_days_{lat}_{lon}",
+            label_visibility="collapsed"
+        )
+    heatmap = cached_figure(
+        'heatmap', lat, lon, forecast, create_hourly_forecast_heatmap,
+        cube, variable, first, last - first + 1, variant=(variable, first, last),
+        default=(first, last) == default_days
+    )
+    render_chart('heatmap', heatmap)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@panel('radar')
+def radar_panel(lat, lon, forecast):
+    """Precipitation probability of the next 7 days"""
+    st.markdown('<div class="glow-card">\n  <h3 style="margin-top:0;">☔ 7-Day Precipitation Radar</h3>', unsafe_allow_html=True)
+    precip_radar = cached_figure('radar', lat, lon, forecast, create_precipitation_radar, forecast.value)
+    render_chart('radar', precip_radar)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@panel('timeline')
+def timeline_panel(lat, lon, forecast):
+    """Temperature, wind, humidity and UV: the next 72 hours, or any range of the whole horizon"""
+    full_range = st.session_state.get('timeline_full_range', False)
+    title = f"{PAST_DAYS + FORECAST_DAYS}-Day Explorer" if full_range else "72-Hour Analytics"
+    st.markdown(f'<div class="glow-card" style="margin-top: 2rem;">\n  <h3 style="margin-top:0;">📊 {title}</h3>', unsafe_allow_html=True)
+    full_range = st.toggle(
+        f"Past {PAST_DAYS} days + {FORECAST_DAYS}-day forecast",
+        key='timeline_full_range',
+        help="Drag the range slider to zoom; zoomed ranges are drawn hour by hour"
+    )
+    
+    history = None
+    if full_range:
+        try:
+            with span("history_fetch"):
+                history = fetch_timeline_history(lat, lon)
+        except Exception as e:
+            st.caption(f"Full range unavailable right now: {e}")
+    times = history.value.hourly.get('time') if history is not None else None
+    if times is None or not len(times):
+        timeline = cached_figure('timeline', lat, lon, forecast, create_multi_metric_timeline, forecast.value)
+        render_chart('timeline', timeline)
+        st.markdown('</div>', unsafe_allow_html=True)
+        return
+    
+    first = times[0].astype('datetime64[s]').item()
+    last = (times[-1] + np.timedelta64(1, 'h')).astype('datetime64[s]').item()
+    start, stop = st.slider(
+        "Range",
+        min_value=first,
+        max_value=last,
+        value=(first, last),
+        step=timedelta(hours=1),
+        format="ddd DD MMM HH:mm",
+        key=f"timeline_range_{lat}_{lon}",
+        label_visibility="collapsed"
+    )
+    zoomed = (start, stop) != (first, last)
+    start, stop = np.datetime64(start, 'm'), np.datetime64(stop, 'm')
+    explorer = cached_figure(
+        'timeline_range', lat, lon, history, create_timeline_explorer,
+        history.value, start, stop, config.TIMELINE_MAX_POINTS, variant=(start, stop),
+        default=not zoomed
+    )
+    render_chart('timeline_range', explorer)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@panel('air_sea')
+def air_sea_panel(lat, lon, forecast):
+    """Air quality and sea state, noting sources that could not be fetched"""
+    weather_data = forecast.value
+    aqi = weather_data.current.get('air_quality.us_aqi', float('nan'))
+    aqi_label = f" · US AQI {aqi:.0f}" if aqi == aqi else ""
+    st.markdown(f'<div class="glow-card" style="margin-top: 2rem;">\n  <h3 style="margin-top:0;">🌍 Air & Sea{aqi_label}</h3>', unsafe_allow_html=True)
+    air_sea = cached_figure('air_sea', lat, lon, forecast, create_air_and_sea_timeline, weather_data)
+    render_chart('air_sea', air_sea)
+    unavailable = [name.replace('_', ' ') for name, status in weather_data.meta.get('sources', {}).items() if 'error' in status]
+    if unavailable:
+        st.caption(f"Unavailable right now: {', '.join(unavailable)}")
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@panel('insights')
+def insights_panel(forecast):
+    """Time-ranged alerts and tips over the coming week, from INSIGHT_RULES"""
+    with span("insights"):
+        alerts = insights.evaluate(forecast.value, INSIGHT_RULES)
+    runs = {}
+    for alert in alerts:
+        runs.setdefault(alert.rule, []).append(alert)
+    items = []
+    for rule in INSIGHT_RULES:
+        if rule not in runs:
+            continue
+        first, more = runs[rule][0], len(runs[rule]) - 1
+        later = f" (+{more} more)" if more else ""
+        items.append(
+            f"<li>{rule.icon} <b>{rule.name}</b> · {html.escape(insights.condition(rule))} "
+            f"<b>{insights.when(first)}</b>{later}: {rule.advice}</li>"
+        )
+    insight_items = "".join(items[:INSIGHT_MAX_ITEMS]) if items else "<li>🌤️ <b>Normal Conditions</b>: Weather conditions are within typical ranges.</li>"
+
+    st.markdown(f'''
+<div class="glow-card" style="margin-top: 2rem;">
+  <h2 style="margin-top:0;">🤖 AI WEATHER INSIGHTS</h2>
+  <ul style="margin-bottom:0;">
+    {insight_items}
+  </ul>
+</div>
+''', unsafe_allow_html=True)
+
 # ========================================
 # MAIN APP
 # ========================================
 def main():
+    with span("styles"):
+        st.markdown(GLOBAL_CSS, unsafe_allow_html=True)
+        st.markdown(BACKGROUND_CSS, unsafe_allow_html=True)
+        st.html(STARFIELD_HTML)
+    
     # Hero Section
     st.markdown('<h1 class="hero-title">ELITE WEATHER HUB</h1>', unsafe_allow_html=True)
     st.markdown('<p class="hero-subtitle">⚡ Advanced Real-Time Weather Analytics & Forecasting Platform ⚡</p>', unsafe_allow_html=True)
     
     # City Selection
-    st.markdown("""
+    with span("styles"):
+        st.markdown("""
     <style>
     .hero-select-card { margin: 1.25rem auto 0 auto; padding: 20px 22px; border-radius: 20px; }
     .hero-select-card .stSelectbox * { color-scheme: dark; }
@@ -865,88 +1361,37 @@ def main():
     
     # Get coordinates
     lat, lon = WORLD_CITIES[selected_city]
+    start_refresh_scheduler()
     
     # Loading animation
-    weather_data = None
+    forecast = None
     with st.spinner('🚀 Fetching elite weather data from satellites...'):
         try:
-            weather_data = fetch_weather_data(lat, lon)
+            with span("fetch"):
+                forecast = fetch_weather_data(lat, lon)
         except Exception as e:
             st.error(f"⚠️ Unable to fetch weather data: {str(e)}")
             st.stop()
     
-    if weather_data is None:
+    if forecast is None:
         st.stop()
         return
     
-    # Extract current weather
-    current = weather_data['current']
-    hourly = weather_data['hourly']
-    daily = weather_data['daily']
-    
-    # Current weather metrics
-    current_temp = current['temperature_2m']
-    feels_like = current['apparent_temperature']
-    humidity = current['relative_humidity_2m']
-    pressure = current['surface_pressure']
-    wind_speed = current['wind_speed_10m']
-    wind_direction = current['wind_direction_10m']
-    wind_gusts = current['wind_gusts_10m']
-    weather_code = current['weather_code']
-    
-    # Get weather condition
-    icon, condition, color = WEATHER_CONDITIONS.get(weather_code, ("❓", "Unknown", "#888888"))
+    city_name = selected_city.replace('🏙️ ', '').replace('🌉 ', '').replace('🗼 ', '').replace('🏯 ', '').replace('🌊 ', '').replace('🏗️ ', '').replace('🌆 ', '').replace('🌴 ', '').replace('🌁 ', '').replace('⛰️ ', '').replace('🏔️ ', '').replace('🏛️ ', '').replace('🏖️ ', '').replace('🌸 ', '')
     
     st.markdown("---")
     
-    # Current Weather Hero Section
-    st.markdown(f"""
-    <div class="glow-card" style="text-align: center; margin: 2rem 0;">
-        <div class="weather-icon" style="color: {color}; margin-bottom: 1rem;">{icon}</div>
-        <h2 style="color: white; margin-bottom: 0.5rem; font-family: 'Orbitron';">{selected_city.replace('🏙️ ', '').replace('🌉 ', '').replace('🗼 ', '').replace('🏯 ', '').replace('🌊 ', '').replace('🏗️ ', '').replace('🌆 ', '').replace('🌴 ', '').replace('🌁 ', '').replace('⛰️ ', '').replace('🏔️ ', '').replace('🏛️ ', '').replace('🏖️ ', '').replace('🌸 ', '')}</h2>
-        <h3 style="color: {color}; margin: 0;">{condition}</h3>
-        <p style="color: #a8b2d1; margin-top: 1rem;">Last Updated: {datetime.now().strftime('%I:%M %p')}</p>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # Key Metrics Row
-    metric_col1, metric_col2, metric_col3, metric_col4 = st.columns(4)
-    
-    with metric_col1:
-        st.markdown('<div class="glow-card floating">', unsafe_allow_html=True)
-        st.metric(
-            label="🌡️ Temperature",
-            value=f"{current_temp:.1f}°C",
-            delta=f"Feels {feels_like:.1f}°C"
-        )
-        st.markdown('</div>', unsafe_allow_html=True)
-    
-    with metric_col2:
-        st.markdown('<div class="glow-card floating">', unsafe_allow_html=True)
-        st.metric(
-            label="💧 Humidity",
-            value=f"{humidity:.0f}%",
-            delta="Optimal" if 40 <= humidity <= 60 else "High" if humidity > 60 else "Low"
-        )
-        st.markdown('</div>', unsafe_allow_html=True)
-    
-    with metric_col3:
-        st.markdown('<div class="glow-card floating">', unsafe_allow_html=True)
-        st.metric(
-            label="💨 Wind Speed",
-            value=f"{wind_speed:.1f} km/h",
-            delta=f"Gusts {wind_gusts:.1f} km/h"
-        )
-        st.markdown('</div>', unsafe_allow_html=True)
-    
-    with metric_col4:
-        st.markdown('<div class="glow-card floating">', unsafe_allow_html=True)
-        st.metric(
-            label="🌪️ Pressure",
-            value=f"{pressure:.0f} hPa",
-            delta="Normal" if 1013-20 <= pressure <= 1013+20 else "High" if pressure > 1013+20 else "Low"
-        )
-        st.markdown('</div>', unsafe_allow_html=True)
+    # Current Weather Hero Section & Key Metrics Row
+    live = st.toggle(
+        "🔴 Live conditions",
+        value=st.query_params.get("live") == "1",
+        key="live_mode",
+        help=f"Refresh the current conditions every {config.LIVE_INTERVAL:.0f} s without reloading the page",
+    )
+    if live:
+        live_conditions_panel(city_name, lat, lon, forecast, live=True)
+    else:
+        conditions_panel(city_name, lat, lon, forecast)
     
     st.markdown("---")
     
@@ -954,97 +1399,31 @@ def main():
     viz_col1, viz_col2, viz_col3 = st.columns([1, 1, 1])
     
     with viz_col1:
-        st.markdown('<div class="glow-card">\n  <h3 style="margin-top:0;">🌡️ Temperature</h3>', unsafe_allow_html=True)
-        temp_gauge = create_temperature_gauge(current_temp, feels_like)
-        st.plotly_chart(temp_gauge, use_container_width=True, config={'displayModeBar': False})
-        st.markdown('</div>', unsafe_allow_html=True)
+        gauge_panel(lat, lon, forecast)
     
     with viz_col2:
-        st.markdown('<div class="glow-card">\n  <h3 style="margin-top:0;">🧭 Wind Direction</h3>', unsafe_allow_html=True)
-        wind_compass = create_wind_compass(wind_speed, wind_direction)
-        st.plotly_chart(wind_compass, use_container_width=True, config={'displayModeBar': False})
-        st.markdown('</div>', unsafe_allow_html=True)
+        compass_panel(lat, lon, forecast)
     
     with viz_col3:
-        st.markdown('<div class="glow-card">\n  <h3 style="margin-top:0;">😊 Weather Mood</h3>', unsafe_allow_html=True)
-        mood_indicator = create_weather_mood_indicator(weather_code, current_temp, humidity)
-        st.plotly_chart(mood_indicator, use_container_width=True, config={'displayModeBar': False})
-        st.markdown('</div>', unsafe_allow_html=True)
+        mood_panel(lat, lon, forecast)
     
     # Advanced Visualizations Row 2
     viz_col4, viz_col5 = st.columns([1, 1])
     
     with viz_col4:
-        st.markdown('<div class="glow-card">\n  <h3 style="margin-top:0;">🔥 48-Hour Temperature Heatmap</h3>', unsafe_allow_html=True)
-        heatmap = create_hourly_forecast_heatmap(hourly)
-        st.plotly_chart(heatmap, use_container_width=True, config={'displayModeBar': False})
-        st.markdown('</div>', unsafe_allow_html=True)
+        heatmap_panel(lat, lon, forecast)
     
     with viz_col5:
-        st.markdown('<div class="glow-card">\n  <h3 style="margin-top:0;">☔ 7-Day Precipitation Radar</h3>', unsafe_allow_html=True)
-        precip_radar = create_precipitation_radar(daily)
-        st.plotly_chart(precip_radar, use_container_width=True, config={'displayModeBar': False})
-        st.markdown('</div>', unsafe_allow_html=True)
+        radar_panel(lat, lon, forecast)
     
     # Comprehensive Timeline
-    st.markdown('<div class="glow-card" style="margin-top: 2rem;">\n  <h3 style="margin-top:0;">📊 72-Hour Analytics</h3>', unsafe_allow_html=True)
-    timeline = create_multi_metric_timeline(hourly)
-    st.plotly_chart(timeline, use_container_width=True, config={'displayModeBar': False})
-    st.markdown('</div>', unsafe_allow_html=True)
+    timeline_panel(lat, lon, forecast)
+    
+    # Air Quality & Marine (fetched concurrently with the forecast)
+    air_sea_panel(lat, lon, forecast)
     
     # Weather Insights & Alerts
-    insights = []
-
-    # Temperature insights
-    if current_temp > 30:
-        insights.append("🔥 **Heat Alert**: Very hot conditions! Stay hydrated and seek shade.")
-    elif current_temp < 0:
-        insights.append("🧊 **Cold Alert**: Freezing temperatures! Bundle up and watch for ice.")
-    elif 20 <= current_temp <= 25:
-        insights.append("🌿 **Perfect Weather**: Ideal temperature for outdoor activities!")
-
-    # Wind insights
-    if wind_speed > 30:
-        insights.append("💨 **Wind Warning**: Strong winds detected! Secure loose objects.")
-    elif wind_speed < 5:
-        insights.append("🍃 **Calm Conditions**: Very light winds, perfect for outdoor dining.")
-
-    # Humidity insights
-    if humidity > 80:
-        insights.append("💧 **High Humidity**: Muggy conditions, feels warmer than actual temperature.")
-    elif humidity < 30:
-        insights.append("🏜️ **Low Humidity**: Dry air, consider using moisturizer and staying hydrated.")
-
-    # Pressure insights
-    if pressure < 1000:
-        insights.append("📉 **Low Pressure**: Weather changes likely, possible storms approaching.")
-    elif pressure > 1030:
-        insights.append("📈 **High Pressure**: Stable, clear weather conditions expected.")
-
-    # UV insights
-    max_uv_today = daily['uv_index_max'][0] if daily['uv_index_max'] else 0
-    if max_uv_today > 8:
-        insights.append("☀️ **UV Warning**: Very high UV index! Use SPF 30+ sunscreen.")
-    elif max_uv_today > 5:
-        insights.append("🕶️ **UV Caution**: Moderate to high UV levels, wear sunglasses.")
-
-    # Precipitation insights
-    rain_today = daily['precipitation_probability_max'][0] if daily['precipitation_probability_max'] else 0
-    if rain_today > 70:
-        insights.append("☔ **Rain Alert**: High chance of rain today, carry an umbrella!")
-    elif rain_today < 20:
-        insights.append("☀️ **Dry Day**: Low chance of rain, perfect for outdoor plans!")
-
-    insight_items = "".join(f"<li>{ins}</li>" for ins in insights[:5]) if insights else "<li>🌤️ <b>Normal Conditions</b>: Weather conditions are within typical ranges.</li>"
-
-    st.markdown(f'''
-<div class="glow-card" style="margin-top: 2rem;">
-  <h2 style="margin-top:0;">🤖 AI WEATHER INSIGHTS</h2>
-  <ul style="margin-bottom:0;">
-    {insight_items}
-  </ul>
-</div>
-''', unsafe_allow_html=True)
+    insights_panel(forecast)
     
     # Footer
     st.markdown("---")
@@ -1058,6 +1437,10 @@ def main():
         </p>
     </div>
     """, unsafe_allow_html=True)
+    
+    if config.DEBUG_PANEL or st.query_params.get("debug") == "1":
+        render_debug_panel()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with rerun():
+        main()
\ No newline at end of file
@@ -0,0 +1,21 @@
+"""Point the data layer at the local Open-Meteo stub before it is imported"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tools.openmeteo_stub import StubServer  # noqa: E402
+
+_stub = None
+
+
+def pytest_configure(config):
+    global _stub
+    _stub = StubServer().start()
+    os.environ["OPEN_METEO_BASE_URL"] = _stub.base_url
+
+
+def pytest_unconfigure(config):
+    if _stub is not None:
+        _stub.stop()
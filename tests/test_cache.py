@@ -0,0 +1,25 @@
+import time
+
+from weather_hub.cache import ForecastCache, SQLiteBackend
+
+
+def _cache(path, decoded):
+    def decode(value):
+        decoded.append(value)
+        return value
+
+    return ForecastCache(soft_ttl=0.0, hard_ttl=60.0, backend=SQLiteBackend(str(path)), decode=decode)
+
+
+def test_stale_local_entry_decodes_only_newer_shared_copies(tmp_path):
+    decoded = []
+    path = tmp_path / "forecasts.sqlite3"
+    first, second = _cache(path, decoded), _cache(path, decoded)
+    first.put("key", {"v": 1}, time.time())
+    for _ in range(3):
+        assert first.get_entry("key").value == {"v": 1}
+    assert decoded == []
+
+    second.put("key", {"v": 2}, time.time() + 1)
+    assert first.get_entry("key").value == {"v": 2}
+    assert decoded == [{"v": 2}]
@@ -0,0 +1,34 @@
+import numpy as np
+
+from weather_hub.downsample import downsample, lttb_indices
+
+HOURS = np.arange("2026-10-01T00", "2026-10-18T00", dtype="datetime64[h]")
+
+
+def test_keeps_first_last_and_peaks():
+    y = np.sin(np.arange(len(HOURS)) / 10.0)
+    y[200] = 5.0
+    indices = lttb_indices(HOURS, y, 50)
+    assert len(indices) == 50
+    assert indices[0] == 0 and indices[-1] == len(HOURS) - 1
+    assert np.all(np.diff(indices) > 0)
+    assert 200 in indices
+
+
+def test_short_series_returned_unchanged():
+    y = np.arange(10, dtype=np.float32)
+    x, kept = downsample(HOURS[:10], y, 10)
+    assert np.array_equal(x, HOURS[:10]) and np.array_equal(kept, y)
+    assert np.array_equal(lttb_indices(HOURS[:10], y, 240), np.arange(10))
+
+
+def test_nan_points_are_skipped_and_gaps_kept():
+    y = np.cos(np.arange(len(HOURS)) / 6.0)
+    y[::3] = np.nan
+    y[100:160] = np.nan
+    indices = lttb_indices(HOURS, y, 40)
+    inner = indices[1:-1]
+    # Only a bucket with no finite point contributes a NaN, marking the gap
+    gap = (inner >= 100) & (inner < 160)
+    assert np.isfinite(y[inner[~gap]]).all()
+    assert gap.any()
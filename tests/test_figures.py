@@ -0,0 +1,32 @@
+import numpy as np
+
+from weather_hub.figures import FigureCache, sizeof
+
+
+def test_byte_budget_evicts_least_recently_used():
+    cache = FigureCache(max_entries=10, max_bytes=2500)
+    for key in "abc":
+        cache.get_or_build(key, lambda: np.zeros(1000, dtype=np.uint8))
+    assert len(cache) == 2
+    assert cache.bytes == 2000
+    built = []
+    cache.get_or_build("a", lambda: built.append("a") or np.zeros(1000, dtype=np.uint8))
+    assert built == ["a"]
+
+
+def test_variant_cache_cannot_evict_defaults():
+    defaults = FigureCache(max_entries=4, max_bytes=10_000)
+    variants = FigureCache(max_entries=2, max_bytes=10_000, name="figure_variant")
+    defaults.get_or_build("default", lambda: np.zeros(10))
+    for day in range(20):
+        variants.get_or_build(("range", day), lambda: np.zeros(10))
+    built = []
+    defaults.get_or_build("default", lambda: built.append(1))
+    assert built == []
+    assert len(variants) == 2
+
+
+def test_sizeof_counts_nested_arrays():
+    values = np.zeros(100, dtype=np.float64)
+    assert sizeof(values) == 800
+    assert sizeof(("label", {"x": values})) > 800
@@ -0,0 +1,54 @@
+import time
+from urllib.parse import urlencode
+
+from weather_hub import config, forecast
+from weather_hub.cache import coord_key, current_cache, forecast_cache
+from weather_hub.forecast import build_params, chunk_coordinates, forecast_key, get_current_entry
+from weather_hub.requirements import Requirement, combine
+
+LIVE = combine([Requirement(current=("temperature_2m",))])["forecast"]
+
+
+def test_live_tick_refetches_stale_current_entry(monkeypatch):
+    monkeypatch.setattr(current_cache, "soft_ttl", 0.0)
+    first = get_current_entry(21.0, 31.0, LIVE)
+    second = get_current_entry(21.0, 31.0, LIVE)
+    assert not second.stale
+    assert second.fetched_at > first.fetched_at
+    key = forecast_key(21.0, 31.0, LIVE)
+    assert current_cache.get_entry(key) is not None
+    assert forecast_cache.get_entry(key) is None
+
+
+def test_chunks_fit_the_encoded_url_limit():
+    coords = [(-33.8688 + i / 7, 151.2093 - i / 3) for i in range(400)]
+    chunks = list(chunk_coordinates(coords, max_locations=1000, max_url_length=2000))
+    assert [c for chunk in chunks for c in chunk] == coords
+    for chunk in chunks:
+        points = [coord_key(lat, lon) for lat, lon in chunk]
+        params = build_params([lat for lat, _ in points], [lon for _, lon in points])
+        assert len(config.FORECAST_URL) + 1 + len(urlencode(params)) <= 2000
+
+
+def _wait_for_revalidation(key):
+    deadline = time.monotonic() + 5
+    while key in forecast._revalidating and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_failed_revalidations_are_forgotten_after_the_backoff(monkeypatch):
+    def fail(priority):
+        raise OSError("upstream down")
+
+    monkeypatch.setattr(config, "REVALIDATE_FAILURE_BACKOFF", 60.0)
+    assert forecast.schedule_revalidation("failing", fail)
+    _wait_for_revalidation("failing")
+    assert not forecast.schedule_revalidation("failing", fail)
+
+    monkeypatch.setattr(config, "REVALIDATE_FAILURE_BACKOFF", 0.0)
+    forecast._revalidate_after.clear()
+    for key in ("a", "b", "c"):
+        forecast.schedule_revalidation(key, fail)
+        _wait_for_revalidation(key)
+    forecast.schedule_revalidation("other", fail)
+    assert not {"a", "b", "c"} & set(forecast._revalidate_after)
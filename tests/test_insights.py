@@ -0,0 +1,44 @@
+import numpy as np
+
+from weather_hub.frame import WeatherFrame
+from weather_hub.insights import Rule, evaluate, when
+
+NOW = np.datetime64("2026-10-19T00:30", "m")
+WINDY = Rule("Windy", "💨", "hourly", "wind_speed_10m", "wind", ">", 30, "km/h")
+GUSTY = Rule("Gusty", "💨", "hourly", "wind_speed_10m", "wind", ">", 30, "km/h", min_rows=3)
+
+
+def _frame(wind):
+    times = np.datetime64("2026-10-19T00:00") + np.arange(len(wind)) * np.timedelta64(1, "h")
+    return WeatherFrame.from_payload({
+        "utc_offset_seconds": 0,
+        "hourly": {
+            "time": [str(t) for t in times.astype("datetime64[m]")],
+            "wind_speed_10m": wind,
+        },
+    })
+
+
+def test_runs_touching_either_end_of_the_window():
+    wind = [40, 40, 10, 10, 10, 10, 40, 40]
+    alerts = evaluate(_frame(wind), [WINDY], now=NOW)
+    assert [(str(a.start), str(a.stop)) for a in alerts] == [
+        ("2026-10-19T00:00", "2026-10-19T02:00"),
+        ("2026-10-19T06:00", "2026-10-19T08:00"),
+    ]
+    assert when(alerts[-1]) == "Mon 06:00–08:00"
+
+
+def test_single_hour_run_and_min_rows():
+    wind = [10, 45, 10, 35, 36, 37, 10]
+    alerts = evaluate(_frame(wind), [WINDY], now=NOW)
+    assert [(str(a.start), a.peak) for a in alerts] == [
+        ("2026-10-19T01:00", 45.0),
+        ("2026-10-19T03:00", 37.0),
+    ]
+    gusts = evaluate(_frame(wind), [GUSTY], now=NOW)
+    assert [str(a.start) for a in gusts] == ["2026-10-19T03:00"]
+
+
+def test_all_nan_series_raises_nothing():
+    assert evaluate(_frame([None] * 24), [WINDY, GUSTY], now=NOW) == []
@@ -0,0 +1,26 @@
+from weather_hub.forecast import FULL_REQUEST, get_forecast_entry
+from weather_hub.metrics import current_spans, rerun
+from weather_hub.sources import get_dataset_entry
+
+
+def _stages(fetch):
+    with rerun(test="spans"):
+        fetch()
+        return {span["stage"] for span in current_spans()}
+
+
+def test_cold_miss_records_upstream_stages():
+    # Hedged attempts run on a pool thread; their spans still belong to the rerun
+    stages = _stages(lambda: get_forecast_entry(12.34, 56.78))
+    assert {"upstream_request", "json_decode", "rate_limit_wait", "frame_decode"} <= stages
+
+
+def test_spans_outside_a_rerun_are_not_collected():
+    get_forecast_entry(12.35, 56.79)
+    assert current_spans() == []
+
+
+def test_concurrent_source_fetch_records_decode_stages():
+    plan = {"forecast": FULL_REQUEST}
+    stages = _stages(lambda: get_dataset_entry(12.36, 56.80, plan))
+    assert {"upstream_request", "frame_decode"} <= stages
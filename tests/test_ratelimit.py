@@ -0,0 +1,89 @@
+import pytest
+
+from weather_hub import ratelimit
+from weather_hub.ratelimit import BACKGROUND, MemoryStore, RateLimited, RateLimiter, SQLiteStore
+
+DAY = 86400
+
+
+class FakeClock:
+    """Stands in for the time module; only moves when advanced"""
+
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock(20000 * DAY + 100.0)
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+def _limiter(per_minute=60, burst=10, per_day=0, reserve=0.5, store=None):
+    return RateLimiter(per_minute, burst, per_day, reserve, store or MemoryStore(burst))
+
+
+def test_background_refused_below_the_reserve_floor(clock):
+    limiter = _limiter()
+    for _ in range(5):
+        limiter.acquire(timeout=0)
+    with pytest.raises(RateLimited):
+        limiter.acquire(BACKGROUND, timeout=0)
+    # The reserved half is still there for visitors
+    limiter.acquire(timeout=0)
+
+    clock.advance(10)
+    limiter.acquire(BACKGROUND, timeout=0)
+
+
+def test_daily_quota_blocks_until_the_day_rolls_over(clock):
+    limiter = _limiter(per_minute=0, per_day=4, reserve=0.25)
+    for _ in range(3):
+        limiter.acquire(BACKGROUND, timeout=0)
+    with pytest.raises(RateLimited):
+        limiter.acquire(BACKGROUND, timeout=0)
+    limiter.acquire(timeout=0)
+    with pytest.raises(RateLimited) as refused:
+        limiter.acquire(timeout=0)
+    assert refused.value.retry_after == DAY - 100
+
+    clock.advance(DAY - 101)
+    with pytest.raises(RateLimited):
+        limiter.acquire(timeout=0)
+    clock.advance(1)
+    limiter.acquire(timeout=0)
+    assert limiter.usage()["day"] == 1
+
+
+def test_drain_empties_the_bucket(clock):
+    limiter = _limiter(reserve=0.0)
+    limiter.drain()
+    assert limiter.usage()["tokens"] == 0
+    with pytest.raises(RateLimited) as refused:
+        limiter.acquire(timeout=0)
+    assert refused.value.retry_after == pytest.approx(1.0)
+
+    clock.advance(1)
+    limiter.acquire(timeout=0)
+
+
+def test_sqlite_stores_share_one_bucket(clock, tmp_path):
+    path = str(tmp_path / "ratelimit.sqlite3")
+    first = _limiter(burst=3, per_day=100, reserve=0.0, store=SQLiteStore(3, path))
+    second = _limiter(burst=3, per_day=100, reserve=0.0, store=SQLiteStore(3, path))
+    first.acquire(timeout=0)
+    first.acquire(timeout=0)
+    second.acquire(timeout=0)
+    with pytest.raises(RateLimited):
+        first.acquire(timeout=0)
+    assert first.usage() == second.usage() == {"tokens": 0, "minute": 3, "day": 3}
@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from weather_hub import config, resilience
+from weather_hub.client import LatencyBudgetExceeded
+from weather_hub.metrics import Summary
+from weather_hub.ratelimit import BACKGROUND
+from weather_hub.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, fetch_json
+
+
+class StubUpstream:
+    """Stands in for client.get_json: each call plays the next scripted reply
+
+    A reply is a value to return, an exception to raise or ``(delay, value)``
+    to answer after ``delay`` seconds (cut short once the test is over).
+    """
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = 0
+        self.released = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, url, params=None, priority=None, cost=1, deadline=None):
+        with self._lock:
+            reply = self.replies[min(self.calls, len(self.replies) - 1)]
+            self.calls += 1
+        if isinstance(reply, BaseException):
+            raise reply
+        if isinstance(reply, tuple):
+            delay, reply = reply
+            self.released.wait(delay)
+        return reply
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    def install(*replies):
+        stub = StubUpstream(*replies)
+        monkeypatch.setattr(resilience, "get_json", stub)
+        stubs.append(stub)
+        return stub
+
+    stubs = []
+    yield install
+    for stub in stubs:
+        stub.released.set()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_breaker_opens_after_the_threshold(upstream):
+    stub = upstream(requests.ConnectionError("down"))
+    circuit = CircuitBreaker("test", failure_threshold=3, cooldown=30.0)
+    for _ in range(3):
+        with pytest.raises(requests.ConnectionError):
+            fetch_json("http://upstream", priority=BACKGROUND, circuit=circuit)
+    assert circuit.state == OPEN
+
+    with pytest.raises(CircuitOpen):
+        fetch_json("http://upstream", priority=BACKGROUND, circuit=circuit)
+    assert stub.calls == 3
+
+
+def test_breaker_lets_one_half_open_probe_through(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience, "time", clock)
+    circuit = CircuitBreaker("test", failure_threshold=1, cooldown=30.0)
+    circuit.record_failure()
+    with pytest.raises(CircuitOpen):
+        circuit.allow()
+
+    clock.now += 30.0
+    circuit.allow()
+    assert circuit.state == HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        circuit.allow()
+
+    circuit.record_success()
+    assert circuit.state == CLOSED
+    circuit.allow()
+
+
+def test_hedge_fires_after_p95_and_first_answer_wins(monkeypatch, upstream):
+    latencies = Summary(config.METRICS_WINDOW)
+    for _ in range(config.HEDGE_MIN_SAMPLES):
+        latencies.observe(0.05)
+    monkeypatch.setattr(resilience, "_latencies", latencies)
+    monkeypatch.setattr(config, "HEDGE_MIN_DELAY", 0.01)
+    stub = upstream((5.0, "slow"), "fast")
+
+    start = time.monotonic()
+    result = fetch_json("http://upstream", budget=2.0, circuit=CircuitBreaker("test"))
+    elapsed = time.monotonic() - start
+    assert result == "fast"
+    assert stub.calls == 2
+    assert 0.05 <= elapsed < 1.0
+
+
+def test_latency_budget_exceeded(monkeypatch, upstream):
+    monkeypatch.setattr(config, "HEDGE_DEFAULT_DELAY", 0.05)
+    monkeypatch.setattr(resilience, "_latencies", Summary(config.METRICS_WINDOW))
+    upstream((5.0, "late"))
+    circuit = CircuitBreaker("test")
+
+    start = time.monotonic()
+    with pytest.raises(LatencyBudgetExceeded):
+        fetch_json("http://upstream", budget=0.2, circuit=circuit)
+    assert time.monotonic() - start < 1.0
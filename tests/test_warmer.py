@@ -0,0 +1,26 @@
+from weather_hub.requirements import Requirement, combine
+from weather_hub.sources import get_dataset_entry
+from weather_hub.warmer import RefreshScheduler
+
+PLAN = combine([
+    Requirement(current=("temperature_2m",), hourly=("temperature_2m",), days=2),
+    Requirement("air_quality", hourly=("pm2_5",), days=2),
+    Requirement("marine", hourly=("wave_height",), days=2),
+])
+
+
+class NoPopularity:
+    def top(self):
+        return []
+
+
+def test_scheduler_refreshes_every_source_in_the_plan():
+    scheduler = RefreshScheduler(coords=[(41.39, 2.17)], tracker=NoPopularity(), plan=PLAN)
+    due = scheduler.due()
+    assert sorted(name for name, _ in due) == ["air_quality", "forecast", "marine"]
+    for name, coords in due:
+        scheduler._refresh(name, [coords])
+    assert scheduler.due() == []
+    entry = get_dataset_entry(41.39, 2.17, PLAN)
+    assert not entry.stale
+    assert set(entry.value.meta["sources"]) == {"air_quality", "marine"}
@@ -0,0 +1,466 @@
+"""Offline Open-Meteo stand-in for benchmarks, load tests and air-gapped work
+
+Serves ``/v1/forecast``, ``/v1/air-quality`` and ``/v1/marine`` with the same
+query parameters and response layout as the real API, in one of three modes:
+
+- ``synth``  deterministic forecasts for any coordinates and variable list
+- ``replay`` recorded responses from a fixture directory (``--fallback synth``
+  synthesizes anything that was not recorded)
+- ``record`` proxy to the real upstream and save every response as a fixture
+
+Latency, server errors and rate limiting can be injected to reproduce a
+degraded upstream. ``GET /__stats`` reports how many requests were served.
+
+Run it and point the app at it::
+
+    python -m tools.openmeteo_stub --port 8765 --latency-ms 80 --jitter-ms 40
+    OPEN_METEO_BASE_URL=http://127.0.0.1:8765 streamlit run streamlit_app.py
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import numpy as np
+
+UNITS = {
+    "temperature_2m": "°C", "apparent_temperature": "°C",
+    "temperature_2m_max": "°C", "temperature_2m_min": "°C",
+    "relative_humidity_2m": "%", "precipitation_probability": "%",
+    "precipitation_probability_max": "%", "precipitation": "mm",
+    "precipitation_sum": "mm", "precipitation_hours": "h",
+    "wind_speed_10m": "km/h", "wind_gusts_10m": "km/h",
+    "wind_speed_10m_max": "km/h", "wind_gusts_10m_max": "km/h",
+    "wind_direction_10m": "°", "surface_pressure": "hPa", "visibility": "m",
+    "uv_index": "", "uv_index_max": "", "weather_code": "wmo code",
+    "uv_index_clear_sky": "", "pm2_5": "μg/m³", "pm10": "μg/m³", "ozone": "μg/m³",
+    "nitrogen_dioxide": "μg/m³", "us_aqi": "USAQI", "european_aqi": "EAQI",
+    "wave_height": "m", "swell_wave_height": "m", "wave_direction": "°",
+    "wave_period": "s", "sea_surface_temperature": "°C",
+}
+# Endpoints synthesize() can answer; the response layout is the same for all
+SYNTH_PATHS = ("/v1/forecast", "/v1/air-quality", "/v1/marine")
+# Real host of each endpoint, for record mode
+UPSTREAM_HOSTS = {
+    "/v1/forecast": "https://api.open-meteo.com",
+    "/v1/air-quality": "https://air-quality-api.open-meteo.com",
+    "/v1/marine": "https://marine-api.open-meteo.com",
+}
+WEATHER_CODES = np.array([0, 1, 2, 3, 45, 51, 53, 61, 63, 65, 71, 95])
+
+
+# ========================================
+# SYNTHETIC FORECASTS
+# ========================================
+def _rng(lat, lon, name):
+    digest = hashlib.sha1(f"{lat:.4f}|{lon:.4f}|{name}".encode()).digest()
+    return np.random.default_rng(int.from_bytes(digest[:8], "little"))
+
+
+def _noise(lat, lon, name, epoch_hours):
+    """Smooth noise that is a pure function of location, variable and hour"""
+    rng = _rng(lat, lon, name)
+    phases = rng.uniform(0, 2 * np.pi, 3)
+    periods = np.array([29.0, 71.0, 163.0])
+    t = epoch_hours[:, None].astype(np.float64)
+    return np.sin(2 * np.pi * t / periods + phases).sum(axis=1) / 3.0
+
+
+def _hourly_series(name, lat, lon, epoch_hours, local_hour):
+    diurnal = np.sin(2 * np.pi * (local_hour - 9) / 24.0)
+    noise = _noise(lat, lon, name, epoch_hours)
+    base_temp = 28.0 - 0.45 * abs(lat)
+    if name in ("temperature_2m", "apparent_temperature"):
+        temp = base_temp + 5.0 * diurnal + 4.0 * _noise(lat, lon, "temperature_2m", epoch_hours)
+        return temp - 1.5 + noise if name == "apparent_temperature" else temp
+    if name == "relative_humidity_2m":
+        return np.clip(65 - 15 * diurnal + 20 * noise, 10, 100).round()
+    if name == "precipitation_probability":
+        return np.clip(35 + 50 * noise, 0, 100).round()
+    if name == "precipitation":
+        return np.clip(2.0 * noise, 0, None).round(1)
+    if name in ("wind_speed_10m", "wind_gusts_10m"):
+        wind = np.clip(14 + 10 * _noise(lat, lon, "wind_speed_10m", epoch_hours) + 3 * diurnal, 0, None)
+        return wind * 1.7 if name == "wind_gusts_10m" else wind
+    if name == "wind_direction_10m":
+        return ((180 + 170 * noise) % 360).round()
+    if name == "surface_pressure":
+        return 1013 + 14 * noise
+    if name == "visibility":
+        return np.clip(24000 + 16000 * noise, 200, None).round(-1)
+    if name in ("uv_index", "uv_index_clear_sky"):
+        peak = 10 * max(0.2, np.cos(np.radians(lat)))
+        clear_sky = np.clip(peak * np.sin(np.pi * (local_hour - 6) / 12), 0, None)
+        if name == "uv_index_clear_sky":
+            return clear_sky.round(2)
+        return (clear_sky * np.clip(0.75 + 0.25 * noise, 0, 1)).round(2)
+    if name in ("pm2_5", "pm10", "us_aqi", "european_aqi"):
+        pm2_5 = np.clip(12 + 10 * _noise(lat, lon, "pm2_5", epoch_hours) - 3 * diurnal, 1, None)
+        if name == "pm10":
+            return (pm2_5 * 1.6).round(1)
+        if name == "us_aqi":
+            return (pm2_5 * 4.2).round()
+        if name == "european_aqi":
+            return (pm2_5 * 2.4).round()
+        return pm2_5.round(1)
+    if name == "ozone":
+        return np.clip(60 + 25 * diurnal + 15 * noise, 0, None).round(1)
+    if name == "nitrogen_dioxide":
+        return np.clip(18 - 8 * diurnal + 10 * noise, 0, None).round(1)
+    if name in ("wave_height", "swell_wave_height"):
+        waves = np.clip(1.4 + 0.9 * _noise(lat, lon, "wave_height", epoch_hours), 0.1, None)
+        return (waves * 0.7).round(2) if name == "swell_wave_height" else waves.round(2)
+    if name == "wave_direction":
+        return ((240 + 90 * noise) % 360).round()
+    if name == "wave_period":
+        return (8 + 3 * noise).round(2)
+    if name == "sea_surface_temperature":
+        return (base_temp - 2 + 1.5 * noise).round(1)
+    if name == "weather_code":
+        index = ((noise + 1) / 2 * (len(WEATHER_CODES) - 1)).round().astype(int)
+        return WEATHER_CODES[index]
+    return 50 + 50 * noise
+
+
+DAILY_AGGREGATES = {
+    "temperature_2m_max": ("temperature_2m", np.max),
+    "temperature_2m_min": ("temperature_2m", np.min),
+    "apparent_temperature_max": ("apparent_temperature", np.max),
+    "apparent_temperature_min": ("apparent_temperature", np.min),
+    "precipitation_sum": ("precipitation", np.sum),
+    "precipitation_hours": ("precipitation", lambda v, axis: (v > 0).sum(axis=axis)),
+    "precipitation_probability_max": ("precipitation_probability", np.max),
+    "wind_speed_10m_max": ("wind_speed_10m", np.max),
+    "wind_gusts_10m_max": ("wind_gusts_10m", np.max),
+    "uv_index_max": ("uv_index", np.max),
+    "weather_code": ("weather_code", np.max),
+}
+
+
+def _round(values, name):
+    if name in ("weather_code", "wind_direction_10m", "relative_humidity_2m",
+                "precipitation_probability", "precipitation_probability_max", "precipitation_hours",
+                "us_aqi", "european_aqi", "wave_direction"):
+        return [int(v) for v in values]
+    return [round(float(v), 2) for v in values]
+
+
+def _split(value):
+    return [item for item in (value or "").split(",") if item]
+
+
+def synthesize(params, now=None):
+    """Open-Meteo-shaped response for every coordinate in ``params``"""
+    lats = [float(v) for v in _split(params.get("latitude"))]
+    lons = [float(v) for v in _split(params.get("longitude"))]
+    if not lats or len(lats) != len(lons):
+        raise ValueError("Parameter 'latitude' and 'longitude' must have the same number of elements")
+    current_vars = _split(params.get("current"))
+    hourly_vars = _split(params.get("hourly"))
+    daily_vars = _split(params.get("daily"))
+    past_days = int(params.get("past_days", 0))
+    forecast_days = int(params.get("forecast_days", 7))
+    past_hours = params.get("past_hours")
+    forecast_hours = params.get("forecast_hours")
+    # Hour counts relative to now may reach beyond the requested days
+    if past_hours:
+        past_days = max(past_days, -(-int(past_hours) // 24))
+    if forecast_hours:
+        forecast_days = max(forecast_days, -(-int(forecast_hours) // 24) + 1)
+    now = np.datetime64(now or "now", "s")
+
+    results = []
+    for lat, lon in zip(lats, lons):
+        started = time.perf_counter()
+        offset_hours = int(round(lon / 15.0)) if params.get("timezone", "GMT") == "auto" else 0
+        offset = np.timedelta64(offset_hours, "h")
+        local_now = (now + offset).astype("datetime64[h]")
+        first_day = local_now.astype("datetime64[D]") - np.timedelta64(past_days, "D")
+        n_hours = 24 * (past_days + forecast_days)
+        local_hours = first_day.astype("datetime64[h]") + np.arange(n_hours).astype("timedelta64[h]")
+        epoch_hours = (local_hours - offset).astype(np.int64)
+        hour_of_day = (local_hours - local_hours.astype("datetime64[D]")).astype(np.int64)
+
+        result = {
+            "latitude": round(lat, 4), "longitude": round(lon, 4),
+            "generationtime_ms": 0.0, "utc_offset_seconds": offset_hours * 3600,
+            "timezone": "GMT" if offset_hours == 0 else f"Etc/GMT{-offset_hours:+d}",
+            "timezone_abbreviation": f"GMT{offset_hours:+d}" if offset_hours else "GMT",
+            "elevation": 0.0,
+        }
+        cache = {}
+
+        def hourly(name):
+            if name not in cache:
+                cache[name] = _hourly_series(name, lat, lon, epoch_hours, hour_of_day)
+            return cache[name]
+
+        if current_vars:
+            index = int(np.searchsorted(local_hours, local_now))
+            result["current_units"] = {"time": "iso8601", "interval": "seconds",
+                                       **{v: UNITS.get(v, "") for v in current_vars}}
+            result["current"] = {"time": str(local_now.astype("datetime64[m]")), "interval": 900}
+            for name in current_vars:
+                result["current"][name] = _round([hourly(name)[index]], name)[0]
+        if hourly_vars:
+            rows = slice(None)
+            if past_hours or forecast_hours:
+                index = int(np.searchsorted(local_hours, local_now))
+                start = index - int(past_hours or 0)
+                rows = slice(max(0, start), index + int(forecast_hours) if forecast_hours else None)
+            elif params.get("start_hour") or params.get("end_hour"):
+                start = np.datetime64(params.get("start_hour") or str(local_hours[0]), "h")
+                end = np.datetime64(params.get("end_hour") or str(local_hours[-1]), "h")
+                rows = slice(int(np.searchsorted(local_hours, start)),
+                             int(np.searchsorted(local_hours, end, side="right")))
+            result["hourly_units"] = {"time": "iso8601", **{v: UNITS.get(v, "") for v in hourly_vars}}
+            result["hourly"] = {"time": [str(t) + ":00" for t in local_hours[rows]]}
+            for name in hourly_vars:
+                result["hourly"][name] = _round(hourly(name)[rows], name)
+        if daily_vars:
+            days = first_day + np.arange(past_days + forecast_days).astype("timedelta64[D]")
+            result["daily_units"] = {"time": "iso8601", **{v: UNITS.get(v, "") for v in daily_vars}}
+            result["daily"] = {"time": [str(d) for d in days]}
+            for name in daily_vars:
+                source, reducer = DAILY_AGGREGATES.get(name, (name, np.mean))
+                values = reducer(hourly(source).reshape(len(days), 24), axis=1)
+                result["daily"][name] = _round(values, name)
+        result["generationtime_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        results.append(result)
+    return results[0] if len(results) == 1 else results
+
+
+# ========================================
+# FIXTURES
+# ========================================
+def fixture_key(path, params):
+    """Stable file name for a request, independent of parameter order"""
+    canonical = path + "?" + urlencode(sorted(params.items()))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest() + ".json"
+
+
+def fixture_path(directory, path, params):
+    return os.path.join(directory, path.strip("/").replace("/", "_"), fixture_key(path, params))
+
+
+# ========================================
+# SERVER
+# ========================================
+class StubConfig:
+    """Behaviour knobs shared by every request handler"""
+
+    def __init__(self, mode="synth", fixtures="fixtures/openmeteo", fallback=None,
+                 upstream=None, latency_ms=0.0, jitter_ms=0.0,
+                 slow_rate=0.0, slow_ms=0.0, error_rate=0.0, rate_limit=0, now=None, seed=None):
+        self.mode = mode
+        self.fixtures = fixtures
+        self.fallback = fallback
+        # One base URL for every endpoint; None uses each one's real host
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.now = now
+        self.random = random.Random(seed)
+        self.stats = Counter()
+        self.lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    def admit(self):
+        """Seconds until the rate-limit window resets, or 0 when admitted"""
+        if not self.rate_limit:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            if now - self._window_start >= 60:
+                self._window_start, self._window_count = now, 0
+            if self._window_count >= self.rate_limit:
+                return max(1, int(60 - (now - self._window_start)))
+            self._window_count += 1
+            return 0
+
+    def delay(self):
+        with self.lock:
+            delay = self.latency_ms + self.random.uniform(0, self.jitter_ms)
+            if self.slow_rate and self.random.random() < self.slow_rate:
+                delay += self.slow_ms
+            fail = self.error_rate and self.random.random() < self.error_rate
+        return delay / 1000.0, fail
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "OpenMeteoStub/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def stub(self):
+        return self.server.stub
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = body if isinstance(body, bytes) else json.dumps(body, separators=(",", ":")).encode("utf-8")
+        if "gzip" in self.headers.get("Accept-Encoding", "") and len(data) > 1024:
+            data = gzip.compress(data, compresslevel=5)
+            headers = dict(headers or {}, **{"Content-Encoding": "gzip"})
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query, keep_blank_values=True))
+        stub = self.stub
+
+        if url.path == "/__stats":
+            with stub.lock:
+                self._send_json(200, dict(stub.stats))
+            return
+
+        with stub.lock:
+            stub.stats["requests"] += 1
+            stub.stats[f"path:{url.path}"] += 1
+            stub.stats["locations"] += max(1, len(_split(params.get("latitude"))))
+
+        retry_after = stub.admit()
+        if retry_after:
+            with stub.lock:
+                stub.stats["rate_limited"] += 1
+            self._send_json(429, {"error": True, "reason": "Minutely API request limit exceeded"},
+                            {"Retry-After": str(retry_after)})
+            return
+
+        delay, fail = stub.delay()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            with stub.lock:
+                stub.stats["errors"] += 1
+            self._send_json(500, {"error": True, "reason": "Injected upstream failure"})
+            return
+
+        try:
+            status, body = self._respond(url.path, params)
+        except ValueError as e:
+            status, body = 400, {"error": True, "reason": str(e)}
+        self._send_json(status, body)
+
+    def _respond(self, path, params):
+        stub = self.stub
+        if stub.mode == "record":
+            return self._record(path, params)
+        if stub.mode == "replay":
+            fixture = fixture_path(stub.fixtures, path, params)
+            if os.path.exists(fixture):
+                with open(fixture, "rb") as fh:
+                    return 200, fh.read()
+            if stub.fallback != "synth":
+                return 404, {"error": True, "reason": f"No fixture recorded for {path}"}
+        if path not in SYNTH_PATHS:
+            return 404, {"error": True, "reason": f"Unknown endpoint {path}"}
+        return 200, synthesize(params, now=stub.now)
+
+    def _record(self, path, params):
+        stub = self.stub
+        host = stub.upstream or UPSTREAM_HOSTS.get(path)
+        if host is None:
+            return 404, {"error": True, "reason": f"Unknown endpoint {path}"}
+        request = urllib.request.Request(
+            f"{host}{path}?{urlencode(params)}", headers={"Accept": "application/json"}
+        )
+        # Upstream errors are relayed as they are and never recorded
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                body = response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+        except (urllib.error.URLError, OSError) as e:
+            return 502, {"error": True, "reason": f"Upstream unreachable: {e}"}
+        fixture = fixture_path(stub.fixtures, path, params)
+        os.makedirs(os.path.dirname(fixture), exist_ok=True)
+        with open(fixture, "wb") as fh:
+            fh.write(body)
+        return 200, body
+
+
+class StubServer:
+    """Threaded stub server that can run in the background of a benchmark"""
+
+    def __init__(self, host="127.0.0.1", port=0, **options):
+        self.stub = StubConfig(**options)
+        self.httpd = ThreadingHTTPServer((host, port), StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self.stub
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="openmeteo-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--mode", choices=("synth", "replay", "record"), default="synth")
+    parser.add_argument("--fixtures", default="fixtures/openmeteo", help="fixture directory")
+    parser.add_argument("--fallback", choices=("synth",), help="replay: synthesize missing fixtures")
+    parser.add_argument("--upstream", help="record: one base URL for every endpoint (default: each one's real host)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fixed added latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="uniform random extra latency")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests that are slow")
+    parser.add_argument("--slow-ms", type=float, default=0.0, help="extra latency of slow requests")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 500")
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests per minute before 429s")
+    parser.add_argument("--now", help="freeze the synthetic clock, e.g. 2026-01-15T12:00")
+    parser.add_argument("--seed", type=int, help="seed for injected latency and errors")
+    args = parser.parse_args(argv)
+
+    options = vars(args).copy()
+    host, port = options.pop("host"), options.pop("port")
+    server = StubServer(host, port, **options)
+    print(f"Open-Meteo stub ({args.mode}) listening on {server.base_url}", flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Data layer for the Elite Weather Hub dashboard"""
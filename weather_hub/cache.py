@@ -0,0 +1,366 @@
+"""Forecast cache shared by every Streamlit session
+
+Entries have two lifetimes. Until the soft TTL they are fresh; between the
+soft and hard TTL they are stale but may still be served while a refresh
+runs in the background; after the hard TTL they are dropped.
+
+Every process keeps decoded WeatherFrame objects in memory and hands the
+same instance to every session, so a hit costs a dict lookup and no copy.
+That tier is bounded by a memory budget (``WEATHER_HUB_CACHE_MEMORY_BYTES``):
+each entry is sized when stored and, once the total exceeds the budget,
+expired entries and then the least recently or least frequently used ones
+(``WEATHER_HUB_CACHE_EVICTION``) are dropped. Coordinates are snapped to a
+grid (``WEATHER_HUB_COORD_GRID`` degrees), so nearby requests share an entry.
+Optionally a shared backend (``WEATHER_HUB_CACHE_BACKEND=sqlite``) sits
+behind it, so that processes on the same host reuse each other's fetches and
+a restart does not start cold.
+"""
+import json
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict, namedtuple
+
+from . import config
+from .frame import WeatherFrame
+from .metrics import inc, set_gauge
+from .sqlite import ThreadConnections
+
+CacheEntry = namedtuple("CacheEntry", ["value", "fetched_at", "stale"])
+
+
+def _snap(value):
+    grid = config.COORD_GRID
+    if grid > 0:
+        value = round(float(value) / grid) * grid
+    return round(float(value), config.COORD_PRECISION)
+
+
+def coord_key(lat, lon):
+    """Coordinate snapped to the cache grid, so that nearby locations share an entry
+
+    Upstream requests are made for the snapped coordinate too, so an entry
+    holds the same data whichever nearby location filled it.
+    """
+    return (_snap(lat), _snap(lon))
+
+
+# ========================================
+# STORAGE BACKENDS
+# ========================================
+# A backend stores (value, fetched_at) records by key. ``get`` returns the
+# record or None; ``set`` receives the hard TTL so stores can expire records
+# on their own. A shared backend's ``get(key, newer_than)`` returns only a
+# record fetched after ``newer_than``, so an older one is never decoded.
+
+EVICTION_POLICIES = ("lru", "lfu")
+
+
+class MemoryBackend:
+    """Dict storage private to the process, optionally bounded by size
+
+    With ``max_bytes`` every record is sized with ``sizeof(value)`` and each
+    ``set`` evicts until the total fits again: records past their TTL first,
+    then by ``policy``, "lru" (least recently read or written) or "lfu"
+    (fewest reads, the least recent of those first). The record just written
+    is never evicted. ``get(key, touch=False)`` reads without counting as a
+    use. Not thread-safe; ForecastCache serializes access.
+    """
+
+    def __init__(self, max_bytes=None, policy="lru", sizeof=None):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy {policy!r}; expected one of {list(EVICTION_POLICIES)}")
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.sizeof = sizeof or (lambda value: 0)
+        self.bytes = 0
+        self.evictions = Counter()
+        # key -> (value, fetched_at, expires_at, size, reads), least recent first
+        self._records = OrderedDict()
+
+    def get(self, key, touch=True):
+        record = self._records.get(key)
+        if record is None:
+            return None
+        if touch:
+            value, fetched_at, expires_at, size, reads = record
+            self._records[key] = (value, fetched_at, expires_at, size, reads + 1)
+            self._records.move_to_end(key)
+        return record[0], record[1]
+
+    def set(self, key, value, fetched_at, ttl):
+        """Store a record; returns the eviction reason of every record it pushed out"""
+        previous = self._records.pop(key, None)
+        reads = 0
+        if previous is not None:
+            self.bytes -= previous[3]
+            reads = previous[4]
+        size = self.sizeof(value) if self.max_bytes else 0
+        self._records[key] = (value, fetched_at, fetched_at + ttl, size, reads)
+        self.bytes += size
+        return self._evict(key) if self.max_bytes else []
+
+    def _victim(self, keep):
+        now = time.time()
+        candidates = [(key, record) for key, record in self._records.items() if key != keep]
+        if not candidates:
+            return None, None
+        expired = next((key for key, record in candidates if record[2] <= now), None)
+        if expired is not None:
+            return expired, "expired"
+        if self.policy == "lfu":
+            # min() keeps the first of equal counts, i.e. the least recent
+            return min(candidates, key=lambda item: item[1][4])[0], "lfu"
+        return candidates[0][0], "lru"
+
+    def _evict(self, keep):
+        evicted = []
+        while self.bytes > self.max_bytes:
+            key, reason = self._victim(keep)
+            if key is None:
+                break
+            self.delete(key)
+            self.evictions[reason] += 1
+            evicted.append(reason)
+        return evicted
+
+    def delete(self, key):
+        record = self._records.pop(key, None)
+        if record is not None:
+            self.bytes -= record[3]
+
+    def clear(self):
+        self._records.clear()
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self._records)
+
+
+class SQLiteBackend:
+    """On-disk store shared by every process that opens the same file
+
+    Payloads are stored as zlib-compressed JSON. Expired rows are purged on
+    write, and when the total payload size exceeds ``max_bytes`` the oldest
+    fetches are evicted first.
+    """
+
+    def __init__(self, path=None, max_bytes=None):
+        self.path = path or config.CACHE_PATH
+        self.max_bytes = config.CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._connections = ThreadConnections(self.path, synchronous="NORMAL")
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS forecasts ("
+                " key TEXT PRIMARY KEY,"
+                " payload BLOB NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " size INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS forecasts_fetched_at ON forecasts (fetched_at)")
+
+    def _connect(self):
+        return self._connections.get()
+
+    @staticmethod
+    def _encode_key(key):
+        return json.dumps(list(key) if isinstance(key, tuple) else key, separators=(",", ":"))
+
+    def get(self, key, newer_than=None):
+        row = self._connect().execute(
+            "SELECT payload, fetched_at FROM forecasts"
+            " WHERE key = ? AND expires_at > ? AND fetched_at > ?",
+            (self._encode_key(key), time.time(), float("-inf") if newer_than is None else newer_than),
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0])), row[1]
+
+    def set(self, key, value, fetched_at, ttl):
+        blob = zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"), 1)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO forecasts (key, payload, fetched_at, expires_at, size)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (self._encode_key(key), blob, fetched_at, fetched_at + ttl, len(blob)),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        conn.execute("DELETE FROM forecasts WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM forecasts WHERE key IN ("
+            " SELECT key FROM ("
+            "  SELECT key, SUM(size) OVER (ORDER BY fetched_at DESC, key) AS running"
+            "  FROM forecasts)"
+            " WHERE running > ?)",
+            (self.max_bytes,),
+        )
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM forecasts WHERE key = ?", (self._encode_key(key),))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM forecasts")
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM forecasts").fetchone()[0]
+
+
+BACKENDS = {
+    "memory": None,
+    "sqlite": SQLiteBackend,
+}
+
+
+def make_backend(name=None):
+    """Build the shared backend named by ``WEATHER_HUB_CACHE_BACKEND``"""
+    name = (name or config.CACHE_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown cache backend {name!r}; expected one of {sorted(BACKENDS)}")
+    factory = BACKENDS[name]
+    return factory() if factory is not None else None
+
+
+# ========================================
+# FORECAST CACHE
+# ========================================
+class ForecastCache:
+    """Thread-safe soft/hard TTL cache of decoded forecasts
+
+    Reads hit the in-process tier first and fall through to the shared
+    backend when the local copy is missing or stale, picking up fetches
+    made by other processes. ``encode``/``decode`` convert values to and
+    from the JSON-compatible form the shared backend stores. The
+    in-process tier holds at most ``max_bytes`` as measured by ``sizeof``
+    and evicts by ``policy`` (see MemoryBackend). ``name`` labels its metrics.
+    """
+
+    def __init__(self, soft_ttl=None, hard_ttl=None, backend=None, encode=None, decode=None,
+                 max_bytes=None, policy=None, sizeof=None, name="forecast"):
+        self.name = name
+        self.soft_ttl = config.FORECAST_SOFT_TTL if soft_ttl is None else soft_ttl
+        self.hard_ttl = config.FORECAST_HARD_TTL if hard_ttl is None else hard_ttl
+        self.shared = backend
+        self.encode = encode or (lambda value: value)
+        self.decode = decode or (lambda value: value)
+        self._local = MemoryBackend(
+            max_bytes=config.CACHE_MEMORY_MAX_BYTES if max_bytes is None else max_bytes,
+            policy=(policy or config.CACHE_EVICTION).lower(),
+            sizeof=sizeof,
+        )
+        self._lookups = Counter()
+        self._lock = threading.Lock()
+
+    def _store(self, key, value, fetched_at):
+        with self._lock:
+            evicted = self._local.set(key, value, fetched_at, self.hard_ttl)
+            size, entries = self._local.bytes, len(self._local)
+        for reason in evicted:
+            inc("weather_hub_forecast_cache_evictions_total", cache=self.name, reason=reason)
+        set_gauge("weather_hub_forecast_cache_bytes", size, cache=self.name)
+        set_gauge("weather_hub_forecast_cache_entries", entries, cache=self.name)
+
+    def _record(self, key, touch=True):
+        with self._lock:
+            record = self._local.get(key, touch)
+        if self.shared is not None and (record is None or time.time() - record[1] >= self.soft_ttl):
+            # Only a newer shared copy is loaded and decoded
+            shared = self.shared.get(key, None if record is None else record[1])
+            if shared is not None:
+                record = (self.decode(shared[0]), shared[1])
+                self._store(key, record[0], record[1])
+        if record is not None and time.time() - record[1] >= self.hard_ttl:
+            with self._lock:
+                self._local.delete(key)
+            return None
+        return record
+
+    def get_entry(self, key, touch=True):
+        """Return a CacheEntry younger than the hard TTL, or None
+
+        ``touch=False`` looks the entry up without counting it as a use for
+        eviction (housekeeping reads such as refresh checks).
+        """
+        record = self._record(key, touch)
+        if record is None:
+            return None
+        value, fetched_at = record
+        return CacheEntry(value, fetched_at, time.time() - fetched_at >= self.soft_ttl)
+
+    def get(self, key, touch=True):
+        """Return the cached value, or None when missing or stale"""
+        entry = self.get_entry(key, touch)
+        if entry is None or entry.stale:
+            return None
+        return entry.value
+
+    def put(self, key, value, fetched_at=None):
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        self._store(key, value, fetched_at)
+        if self.shared is not None:
+            self.shared.set(key, self.encode(value), fetched_at, self.hard_ttl)
+
+    def expires_in(self, key):
+        """Seconds until ``key`` goes stale, or None when it is not cached"""
+        record = self._record(key, touch=False)
+        if record is None:
+            return None
+        return record[1] + self.soft_ttl - time.time()
+
+    def record_lookup(self, result):
+        """Count one visitor lookup as a "hit", "stale" hit or "miss" for stats()"""
+        with self._lock:
+            self._lookups[result] += 1
+
+    def stats(self):
+        """Entries, memory use, hit rate and evictions of the in-process tier"""
+        with self._lock:
+            lookups = dict(self._lookups)
+            stats = {
+                "entries": len(self._local),
+                "bytes": self._local.bytes,
+                "max_bytes": self._local.max_bytes,
+                "policy": self._local.policy,
+                "evictions": dict(self._local.evictions),
+            }
+        total = sum(lookups.values())
+        served = lookups.get("hit", 0) + lookups.get("stale", 0)
+        stats.update(
+            hits=lookups.get("hit", 0),
+            stale_hits=lookups.get("stale", 0),
+            misses=lookups.get("miss", 0),
+            hit_rate=served / total if total else float("nan"),
+        )
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        set_gauge("weather_hub_forecast_cache_bytes", 0, cache=self.name)
+        set_gauge("weather_hub_forecast_cache_entries", 0, cache=self.name)
+        if self.shared is not None:
+            self.shared.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._local)
+
+
+forecast_cache = ForecastCache(
+    backend=make_backend(),
+    encode=WeatherFrame.to_payload,
+    decode=WeatherFrame.from_payload,
+    sizeof=lambda frame: frame.nbytes,
+)
+# Current conditions polled by live displays: fresh for just under one
+# polling interval, so each tick re-fetches, and private to the process
+current_cache = ForecastCache(
+    soft_ttl=max(0.0, config.LIVE_INTERVAL - config.LIVE_FRESH_MARGIN),
+    hard_ttl=config.LIVE_MAX_AGE,
+    sizeof=lambda frame: frame.nbytes,
+    name="current",
+)
@@ -0,0 +1,139 @@
+"""Shared HTTP client for Open-Meteo
+
+A single long-lived ``requests.Session`` is reused by every Streamlit script
+thread, so TLS connections to the upstream stay warm between cache misses.
+Every attempt, retries included, first takes its share of the upstream call
+budget from weather_hub.ratelimit.
+"""
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import config
+from .metrics import inc, span
+from .ratelimit import INTERACTIVE, rate_limiter
+
+# Responses worth retrying: rate limiting and transient upstream failures
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class LatencyBudgetExceeded(TimeoutError):
+    """The request did not complete before its deadline"""
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the process-wide pooled session, creating it on first use"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def _build_session():
+    session = requests.Session()
+    session.headers.update({
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive",
+        "User-Agent": config.USER_AGENT,
+    })
+    # Retries are handled in get_json so that backoff can be jittered
+    adapter = HTTPAdapter(
+        pool_connections=config.POOL_CONNECTIONS,
+        pool_maxsize=config.POOL_MAXSIZE,
+        max_retries=0,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for the given zero-based attempt"""
+    ceiling = min(config.BACKOFF_MAX, config.BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def _retry_after(response):
+    """Seconds requested by a Retry-After header, capped at BACKOFF_MAX"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return min(config.BACKOFF_MAX, max(0.0, float(value)))
+    except ValueError:
+        return None
+
+
+def _remaining(deadline):
+    """Seconds left before ``deadline`` (a ``time.monotonic()`` value)"""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise LatencyBudgetExceeded("Open-Meteo request ran out of time")
+    return remaining
+
+
+def get_json(url, params=None, timeout=None, retries=None, priority=INTERACTIVE, cost=1, deadline=None):
+    """GET a JSON document with connect/read timeouts and bounded retries
+
+    ``cost`` is the number of upstream calls the request counts as against
+    the rate limit; ``priority`` is INTERACTIVE or BACKGROUND. With a
+    ``deadline`` (``time.monotonic()`` value) rate-limit waits, timeouts and
+    retries are cut short to finish by then.
+    """
+    if timeout is None:
+        timeout = (config.CONNECT_TIMEOUT, config.READ_TIMEOUT)
+    if retries is None:
+        retries = config.MAX_RETRIES
+
+    session = get_session()
+    attempt = 0
+    while True:
+        attempt_timeout = timeout
+        with span("rate_limit_wait"):
+            if deadline is None:
+                rate_limiter.acquire(priority, cost)
+            else:
+                rate_limiter.acquire(priority, cost, timeout=_remaining(deadline))
+                remaining = _remaining(deadline)
+                attempt_timeout = (min(timeout[0], remaining), min(timeout[1], remaining))
+        try:
+            with span("upstream_request"):
+                response = session.get(url, params=params, timeout=attempt_timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            inc("weather_hub_upstream_requests_total", status="error")
+            delay = backoff_delay(attempt)
+            if attempt >= retries or (deadline is not None and time.monotonic() + delay >= deadline):
+                raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        inc("weather_hub_upstream_requests_total", status=response.status_code)
+        if response.status_code == 429:
+            rate_limiter.drain()
+        if response.status_code in RETRY_STATUSES and attempt < retries:
+            delay = _retry_after(response)
+            delay = delay if delay is not None else backoff_delay(attempt)
+            if deadline is None or time.monotonic() + delay < deadline:
+                response.close()
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+        response.raise_for_status()
+        inc("weather_hub_upstream_bytes_total", len(response.content), encoding="decoded")
+        wire_bytes = response.headers.get("Content-Length")
+        if wire_bytes and wire_bytes.isdigit():
+            inc("weather_hub_upstream_bytes_total", int(wire_bytes), encoding="wire")
+        with span("json_decode"):
+            return response.json()
@@ -0,0 +1,185 @@
+"""Runtime settings for the weather data layer
+
+Every value can be overridden with an environment variable so replicas can be
+tuned without code changes.
+"""
+import os
+import tempfile
+
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+# ========================================
+# UPSTREAM
+# ========================================
+# Point at a local stand-in (tools/openmeteo_stub.py) for offline work; it
+# serves every endpoint, while the real API has one host per product
+_BASE_URL_OVERRIDE = os.environ.get("OPEN_METEO_BASE_URL", "").rstrip("/")
+OPEN_METEO_BASE_URL = _BASE_URL_OVERRIDE or "https://api.open-meteo.com"
+FORECAST_URL = f"{OPEN_METEO_BASE_URL}/v1/forecast"
+AIR_QUALITY_URL = f"{_BASE_URL_OVERRIDE or 'https://air-quality-api.open-meteo.com'}/v1/air-quality"
+MARINE_URL = f"{_BASE_URL_OVERRIDE or 'https://marine-api.open-meteo.com'}/v1/marine"
+USER_AGENT = "elite-weather-hub/1.0 (+https://open-meteo.com)"
+
+# ========================================
+# HTTP CLIENT
+# ========================================
+CONNECT_TIMEOUT = _env_float("WEATHER_HUB_CONNECT_TIMEOUT", 3.05)
+READ_TIMEOUT = _env_float("WEATHER_HUB_READ_TIMEOUT", 10.0)
+MAX_RETRIES = _env_int("WEATHER_HUB_MAX_RETRIES", 2)
+BACKOFF_BASE = _env_float("WEATHER_HUB_BACKOFF_BASE", 0.25)
+BACKOFF_MAX = _env_float("WEATHER_HUB_BACKOFF_MAX", 4.0)
+POOL_CONNECTIONS = _env_int("WEATHER_HUB_POOL_CONNECTIONS", 4)
+POOL_MAXSIZE = _env_int("WEATHER_HUB_POOL_MAXSIZE", 16)
+
+# ========================================
+# UPSTREAM RATE LIMIT
+# ========================================
+# Open-Meteo's free tier allows 600 calls/minute and 10,000/day; stay under
+# both. A multi-location request counts one call per location.
+RATE_LIMIT_PER_MINUTE = _env_float("WEATHER_HUB_RATE_LIMIT_PER_MINUTE", 500.0)
+RATE_LIMIT_BURST = _env_float("WEATHER_HUB_RATE_LIMIT_BURST", 100.0)
+RATE_LIMIT_PER_DAY = _env_float("WEATHER_HUB_RATE_LIMIT_PER_DAY", 9500.0)
+# Share of the bucket and of the daily quota only interactive requests may use
+RATE_LIMIT_INTERACTIVE_RESERVE = _env_float("WEATHER_HUB_RATE_LIMIT_INTERACTIVE_RESERVE", 0.25)
+# Longest a request waits for tokens before failing with RateLimited
+RATE_LIMIT_MAX_WAIT = _env_float("WEATHER_HUB_RATE_LIMIT_MAX_WAIT", 5.0)
+RATE_LIMIT_BACKGROUND_MAX_WAIT = _env_float("WEATHER_HUB_RATE_LIMIT_BACKGROUND_MAX_WAIT", 60.0)
+# "memory" limits each process on its own; "sqlite" shares one budget between
+# processes on the same host
+RATE_LIMIT_BACKEND = os.environ.get("WEATHER_HUB_RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_PATH = os.environ.get(
+    "WEATHER_HUB_RATE_LIMIT_PATH",
+    os.path.join(tempfile.gettempdir(), "elite-weather-hub", "ratelimit.sqlite3"),
+)
+
+# ========================================
+# LATENCY BUDGET, HEDGING & CIRCUIT BREAKER
+# ========================================
+# A visitor's blocking fetch gives up after this many seconds, all retries
+# included (background refreshes have no budget)
+LATENCY_BUDGET = _env_float("WEATHER_HUB_LATENCY_BUDGET", 6.0)
+# Send a duplicate request when the first has not answered after the observed
+# p95 upstream latency (DEFAULT_DELAY until MIN_SAMPLES latencies are known)
+HEDGE_ENABLED = os.environ.get("WEATHER_HUB_HEDGE", "1").lower() not in ("0", "false", "no")
+HEDGE_DEFAULT_DELAY = _env_float("WEATHER_HUB_HEDGE_DEFAULT_DELAY", 1.5)
+HEDGE_MIN_DELAY = _env_float("WEATHER_HUB_HEDGE_MIN_DELAY", 0.2)
+HEDGE_MIN_SAMPLES = _env_int("WEATHER_HUB_HEDGE_MIN_SAMPLES", 20)
+HEDGE_CONCURRENCY = _env_int("WEATHER_HUB_HEDGE_CONCURRENCY", 16)
+# Stop calling the upstream for COOLDOWN seconds after FAILURES failures in a row
+BREAKER_FAILURES = _env_int("WEATHER_HUB_BREAKER_FAILURES", 5)
+BREAKER_COOLDOWN = _env_float("WEATHER_HUB_BREAKER_COOLDOWN", 30.0)
+
+# ========================================
+# ADDITIONAL DATA SOURCES
+# ========================================
+# Per-source budget for a visitor's blocking fetch; a source that misses it
+# is left out of the page instead of delaying it
+AIR_QUALITY_TIMEOUT = _env_float("WEATHER_HUB_AIR_QUALITY_TIMEOUT", 4.0)
+MARINE_TIMEOUT = _env_float("WEATHER_HUB_MARINE_TIMEOUT", 4.0)
+SOURCE_CONCURRENCY = _env_int("WEATHER_HUB_SOURCE_CONCURRENCY", 16)
+
+# ========================================
+# FORECAST REQUESTS & CACHE
+# ========================================
+# Fresh for SOFT_TTL seconds; served stale (while revalidating) up to HARD_TTL
+FORECAST_SOFT_TTL = _env_float("WEATHER_HUB_SOFT_TTL", 600.0)
+FORECAST_HARD_TTL = _env_float("WEATHER_HUB_HARD_TTL", 6 * 3600.0)
+REVALIDATE_CONCURRENCY = _env_int("WEATHER_HUB_REVALIDATE_CONCURRENCY", 4)
+# After a failed revalidation, keep serving stale data this long before retrying
+REVALIDATE_FAILURE_BACKOFF = _env_float("WEATHER_HUB_REVALIDATE_FAILURE_BACKOFF", 30.0)
+COORD_PRECISION = _env_int("WEATHER_HUB_COORD_PRECISION", 4)
+# Coordinates are snapped to multiples of this many degrees (0.01 is ~1 km,
+# finer than the forecast models' grids) so nearby requests share an entry;
+# 0 only rounds to COORD_PRECISION decimals
+COORD_GRID = _env_float("WEATHER_HUB_COORD_GRID", 0.01)
+# Memory budget of each process's decoded forecasts; beyond it the least
+# recently ("lru") or least frequently ("lfu") used entries are evicted
+CACHE_MEMORY_MAX_BYTES = _env_int("WEATHER_HUB_CACHE_MEMORY_BYTES", 64 * 1024 * 1024)
+CACHE_EVICTION = os.environ.get("WEATHER_HUB_CACHE_EVICTION", "lru")
+# Memory budget of the merged multi-source datasets (forecast plus extra
+# sources on one time axis), which copy the forecast's arrays
+MERGED_MEMORY_MAX_BYTES = _env_int("WEATHER_HUB_MERGED_MEMORY_BYTES", 16 * 1024 * 1024)
+# "memory" keeps forecasts per process; "sqlite" shares them on disk between
+# processes on the same host and across restarts
+CACHE_BACKEND = os.environ.get("WEATHER_HUB_CACHE_BACKEND", "memory")
+CACHE_PATH = os.environ.get(
+    "WEATHER_HUB_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "elite-weather-hub", "forecasts.sqlite3"),
+)
+CACHE_MAX_BYTES = _env_int("WEATHER_HUB_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+# Refresh cached forecasts incrementally: only the current block and hours
+# [now - PAST_HOURS, now + FORECAST_HOURS) are re-fetched and merged, with a
+# full fetch (daily block, whole horizon) at least every MAX_AGE seconds
+DELTA_ENABLED = os.environ.get("WEATHER_HUB_DELTA", "1").lower() not in ("0", "false", "no")
+DELTA_PAST_HOURS = _env_int("WEATHER_HUB_DELTA_PAST_HOURS", 2)
+DELTA_FORECAST_HOURS = _env_int("WEATHER_HUB_DELTA_FORECAST_HOURS", 48)
+DELTA_MAX_AGE = _env_float("WEATHER_HUB_DELTA_MAX_AGE", 3 * 3600.0)
+# Open-Meteo accepts coordinate lists; keep each batch well inside URL and
+# response-size limits (a 17-day hourly payload is ~60 KB per location)
+BULK_MAX_LOCATIONS = _env_int("WEATHER_HUB_BULK_MAX_LOCATIONS", 25)
+BULK_MAX_URL_LENGTH = _env_int("WEATHER_HUB_BULK_MAX_URL_LENGTH", 4000)
+
+# ========================================
+# LIVE CONDITIONS
+# ========================================
+# Live mode re-reads the current block every INTERVAL seconds. Values are
+# fresh for INTERVAL - FRESH_MARGIN seconds, so displays ticking within that
+# window share one current-only request while every tick finds the previous
+# tick's values stale. A tick then fetches on the spot for at most
+# FETCH_BUDGET seconds; a failed poll keeps showing the last values for up to
+# MAX_AGE seconds
+LIVE_INTERVAL = _env_float("WEATHER_HUB_LIVE_INTERVAL", 60.0)
+LIVE_FRESH_MARGIN = _env_float("WEATHER_HUB_LIVE_FRESH_MARGIN", 5.0)
+LIVE_FETCH_BUDGET = _env_float("WEATHER_HUB_LIVE_FETCH_BUDGET", 2.0)
+LIVE_MAX_AGE = _env_float("WEATHER_HUB_LIVE_MAX_AGE", 1800.0)
+
+# ========================================
+# BACKGROUND REFRESH
+# ========================================
+# Refresh an entry when it is within LEAD (+ up to JITTER) seconds of expiry
+REFRESH_LEAD = _env_float("WEATHER_HUB_REFRESH_LEAD", 90.0)
+REFRESH_JITTER = _env_float("WEATHER_HUB_REFRESH_JITTER", 45.0)
+REFRESH_INTERVAL = _env_float("WEATHER_HUB_REFRESH_INTERVAL", 10.0)
+REFRESH_CONCURRENCY = _env_int("WEATHER_HUB_REFRESH_CONCURRENCY", 2)
+REFRESH_FAILURE_BACKOFF = _env_float("WEATHER_HUB_REFRESH_FAILURE_BACKOFF", 60.0)
+# Dynamically tracked locations: keep the top N by decayed request count
+POPULAR_TOP_N = _env_int("WEATHER_HUB_POPULAR_TOP_N", 50)
+POPULARITY_HALF_LIFE = _env_float("WEATHER_HUB_POPULARITY_HALF_LIFE", 1800.0)
+POPULARITY_MIN_SCORE = _env_float("WEATHER_HUB_POPULARITY_MIN_SCORE", 0.25)
+
+# ========================================
+# FIGURE CACHE
+# ========================================
+# Built figures (and the heatmap cube) per process: the default view of each
+# panel, bounded by count and by approximate bytes
+FIGURE_CACHE_MAX_ENTRIES = _env_int("WEATHER_HUB_FIGURE_CACHE_MAX_ENTRIES", 256)
+FIGURE_CACHE_MAX_BYTES = _env_int("WEATHER_HUB_FIGURE_CACHE_BYTES", 32 * 1024 * 1024)
+# Figures for a non-default slider range, kept apart from the defaults
+FIGURE_VARIANT_CACHE_MAX_ENTRIES = _env_int("WEATHER_HUB_FIGURE_VARIANT_CACHE_MAX_ENTRIES", 64)
+FIGURE_VARIANT_CACHE_MAX_BYTES = _env_int("WEATHER_HUB_FIGURE_VARIANT_CACHE_BYTES", 8 * 1024 * 1024)
+
+# ========================================
+# TIMELINE
+# ========================================
+# Points per series the full-range timeline sends (about one per two pixels
+# of a subplot); a zoomed range with fewer hourly rows is sent in full
+TIMELINE_MAX_POINTS = _env_int("WEATHER_HUB_TIMELINE_MAX_POINTS", 240)
+
+# ========================================
+# METRICS
+# ========================================
+METRICS_WINDOW = _env_int("WEATHER_HUB_METRICS_WINDOW", 2048)
+METRICS_JSONL_PATH = os.environ.get("WEATHER_HUB_METRICS_JSONL") or None
+METRICS_PROM_PATH = os.environ.get("WEATHER_HUB_METRICS_PROM") or None
+METRICS_PROM_INTERVAL = _env_float("WEATHER_HUB_METRICS_PROM_INTERVAL", 15.0)
+# Show the per-rerun timing panel to everyone (otherwise only with ?debug=1)
+DEBUG_PANEL = os.environ.get("WEATHER_HUB_DEBUG_PANEL", "").lower() in ("1", "true", "yes")
@@ -0,0 +1,61 @@
+"""Largest-Triangle-Three-Buckets downsampling for long time series
+
+A chart cannot show more points than it has horizontal pixels, so shipping
+and drawing every hourly row of a multi-week series wastes bandwidth and
+browser time. LTTB keeps the first and last point and, from each of
+``n - 2`` equal buckets in between, the point forming the largest triangle
+with the point kept from the previous bucket and the mean of the next one.
+Peaks and troughs survive, unlike with striding or averaging.
+"""
+import numpy as np
+
+
+def lttb_indices(x, y, n):
+    """Indices of at most ``n`` points of (``x``, ``y``) that preserve its shape
+
+    ``x`` must be increasing and numeric (datetime64 arrays are compared as
+    integers). NaN points are never picked unless a whole bucket is NaN,
+    in which case its first index is kept so gaps stay visible.
+    """
+    x = np.asarray(x)
+    if x.dtype.kind == "M":
+        x = x.astype("int64")
+    x = x.astype(np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    length = len(x)
+    if n >= length or n < 3:
+        return np.arange(length)
+
+    finite = np.isfinite(y)
+    # Bucket boundaries over the points between the fixed first and last ones
+    edges = np.linspace(1, length - 1, n - 1).astype(np.int64)
+    picked = np.empty(n, dtype=np.int64)
+    picked[0], picked[-1] = 0, length - 1
+    previous = 0
+    for b in range(n - 2):
+        start, stop = edges[b], edges[b + 1]
+        # The last bucket looks ahead to the fixed last point
+        if b + 2 < len(edges):
+            next_start, next_stop = stop, edges[b + 2]
+        else:
+            next_start, next_stop = length - 1, length
+        ahead = finite[next_start:next_stop]
+        if ahead.any():
+            mean_x = x[next_start:next_stop][ahead].mean()
+            mean_y = y[next_start:next_stop][ahead].mean()
+        else:
+            mean_x, mean_y = x[next_start], y[previous]
+        px = x[previous]
+        py = y[previous] if finite[previous] else mean_y
+        bucket_x, bucket_y = x[start:stop], y[start:stop]
+        areas = np.abs((px - mean_x) * (bucket_y - py) - (px - bucket_x) * (mean_y - py))
+        areas[~finite[start:stop]] = -1.0
+        previous = start + int(np.argmax(areas))
+        picked[b + 1] = previous
+    return picked
+
+
+def downsample(x, y, n):
+    """``x`` and ``y`` reduced to at most ``n`` points with LTTB"""
+    indices = lttb_indices(x, y, n)
+    return np.asarray(x)[indices], np.asarray(y)[indices]
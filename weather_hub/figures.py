@@ -0,0 +1,120 @@
+"""Memoized Plotly figures shared by every Streamlit session
+
+Building a figure (``make_subplots``, per-axis updates, trace validation) is
+a large share of a rerun. Figures only change when new forecast data arrives
+or the "now" anchor of the windows moves, so they are built once per
+(location, forecast version, figure kind, anchor hour) key and reused.
+
+Built ``go.Figure`` objects are cached rather than ``to_dict()`` specs:
+``st.plotly_chart`` re-validates dict input, which costs about as much as
+building the figure, while a Figure is serialized without re-validation.
+Cached figures must therefore be treated as read-only. The cache also holds
+small per-version inputs shared by a panel's figures, such as the heatmap's
+day/hour cube. Both caches are bounded in bytes as well as entries, so they
+count towards the process's memory budgets.
+"""
+import threading
+from collections import OrderedDict
+
+from . import config
+from .metrics import inc, set_gauge
+
+# Approximate cost of one Python object (number, string or container header)
+_OBJECT_OVERHEAD = 64
+
+
+def _nbytes(value):
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, (str, bytes)):
+        return len(value) + _OBJECT_OVERHEAD
+    if isinstance(value, dict):
+        return sum(_nbytes(k) + _nbytes(v) for k, v in value.items()) + _OBJECT_OVERHEAD
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(v) for v in value) + 8 * len(value) + _OBJECT_OVERHEAD
+    return _OBJECT_OVERHEAD
+
+
+def sizeof(value):
+    """Approximate memory held by a cached figure, array, frame or tuple of them"""
+    to_plotly_json = getattr(value, "to_plotly_json", None)
+    if to_plotly_json is not None:
+        # Trace and layout properties without copies or validation
+        value = to_plotly_json()
+    return _nbytes(value)
+
+
+class FigureCache:
+    """Thread-safe LRU cache of built figures, bounded by entries and bytes
+
+    Every value is sized with ``sizeof`` when stored; the least recently
+    used are evicted while there are more than ``max_entries`` or they hold
+    more than ``max_bytes``. The value just stored is never evicted.
+    ``name`` labels the cache's metrics.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, sizeof=sizeof, name="figure"):
+        self.max_entries = max_entries or config.FIGURE_CACHE_MAX_ENTRIES
+        self.max_bytes = config.FIGURE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.sizeof = sizeof
+        self.name = name
+        self.bytes = 0
+        # key -> (figure, size), least recent first
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, build):
+        """Return the figure cached under ``key``, calling ``build()`` on a miss"""
+        with self._lock:
+            record = self._figures.get(key)
+            if record is not None:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                inc("weather_hub_figure_cache_requests_total", cache=self.name, result="hit")
+                return record[0]
+            self.misses += 1
+        inc("weather_hub_figure_cache_requests_total", cache=self.name, result="miss")
+        # Build (and size) outside the lock; concurrent builders of one key just race
+        figure = build()
+        size = self.sizeof(figure)
+        evicted = 0
+        with self._lock:
+            previous = self._figures.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self._figures[key] = (figure, size)
+            self.bytes += size
+            while len(self._figures) > 1 and (
+                len(self._figures) > self.max_entries or self.bytes > self.max_bytes
+            ):
+                _, (_, freed) = self._figures.popitem(last=False)
+                self.bytes -= freed
+                evicted += 1
+            used = self.bytes
+        if evicted:
+            inc("weather_hub_figure_cache_evictions_total", evicted, cache=self.name)
+        set_gauge("weather_hub_figure_cache_bytes", used, cache=self.name)
+        return figure
+
+    def clear(self):
+        with self._lock:
+            self._figures.clear()
+            self.bytes = 0
+        set_gauge("weather_hub_figure_cache_bytes", 0, cache=self.name)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._figures)
+
+
+figure_cache = FigureCache()
+# Figures for non-default widget ranges (heatmap days, timeline zoom): a
+# slider drag builds one per position, so they are kept apart where they
+# cannot push the default figures out
+variant_cache = FigureCache(
+    max_entries=config.FIGURE_VARIANT_CACHE_MAX_ENTRIES,
+    max_bytes=config.FIGURE_VARIANT_CACHE_MAX_BYTES,
+    name="figure_variant",
+)
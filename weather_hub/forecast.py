@@ -0,0 +1,334 @@
+"""Open-Meteo forecast requests, single and batched
+
+What is requested is a RequestSpec (see weather_hub.requirements), normally
+combined from the requirements the page's panels declare; ``FULL_REQUEST``,
+the whole variable catalog below, is the default for callers without one.
+
+Refreshes of an already cached forecast are incremental where possible: only
+the current block and a window of hours around now (``past_hours`` /
+``forecast_hours``) are requested and written over the cached series. The
+full payload, including the daily block, is fetched on a miss, once the
+local day rolls over (the first day of the series moves), and at least every
+``WEATHER_HUB_DELTA_MAX_AGE`` seconds.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import numpy as np
+
+from . import config
+from .cache import CacheEntry, coord_key, current_cache, forecast_cache
+from .frame import WeatherFrame
+from .metrics import inc, span
+from .ratelimit import BACKGROUND, INTERACTIVE
+from .requirements import RequestSpec
+from .resilience import fetch_json
+from .singleflight import SingleFlight
+
+CURRENT_VARIABLES = [
+    "temperature_2m", "relative_humidity_2m", "apparent_temperature",
+    "weather_code", "surface_pressure", "wind_speed_10m",
+    "wind_direction_10m", "wind_gusts_10m"
+]
+HOURLY_VARIABLES = [
+    "temperature_2m", "relative_humidity_2m", "precipitation_probability",
+    "precipitation", "wind_speed_10m", "wind_direction_10m",
+    "visibility", "uv_index", "weather_code"
+]
+DAILY_VARIABLES = [
+    "weather_code", "temperature_2m_max", "temperature_2m_min",
+    "precipitation_sum", "precipitation_hours", "precipitation_probability_max",
+    "wind_speed_10m_max", "wind_gusts_10m_max", "uv_index_max"
+]
+PAST_DAYS = 3
+FORECAST_DAYS = 14
+FULL_REQUEST = RequestSpec(
+    tuple(CURRENT_VARIABLES), tuple(HOURLY_VARIABLES), tuple(DAILY_VARIABLES), PAST_DAYS, FORECAST_DAYS
+)
+# Metadata key recording when a frame's full payload (daily block, whole
+# horizon) was last fetched; delta updates keep it
+FULL_FETCHED_AT = "full_fetched_at"
+
+logger = logging.getLogger(__name__)
+
+
+def forecast_key(lat, lon, spec=None):
+    """Cache key: rounded coordinate plus the signature of the requested spec
+
+    The signature keeps payloads fetched for one set of variables or days
+    from being served to a page that needs another.
+    """
+    return coord_key(lat, lon) + ((spec or FULL_REQUEST).signature,)
+
+
+_revalidator = ThreadPoolExecutor(
+    max_workers=config.REVALIDATE_CONCURRENCY, thread_name_prefix="forecast-revalidate"
+)
+_revalidating = set()
+# key -> monotonic time before which a failed key is not retried, in
+# deadline order (the backoff is constant), so expired ones are pruned from
+# the front and only keys failed within the last backoff are kept
+_revalidate_after = OrderedDict()
+_revalidate_lock = threading.Lock()
+# Coalesces concurrent fetches of one forecast key. Misses and revalidations
+# fly separately: a miss must never wait on a background fetch, which has
+# no latency budget
+_flights = SingleFlight("forecast")
+
+
+def _blocks(spec, blocks):
+    """``block: "a,b"`` parameters for the non-empty ``blocks`` of ``spec``"""
+    return {block: ",".join(getattr(spec, block)) for block in blocks if getattr(spec, block)}
+
+
+def build_params(latitudes, longitudes, spec=None):
+    """Query parameters for one forecast call covering the given coordinates"""
+    spec = spec or FULL_REQUEST
+    return {
+        "latitude": ",".join(str(lat) for lat in latitudes),
+        "longitude": ",".join(str(lon) for lon in longitudes),
+        **_blocks(spec, ("current", "hourly", "daily")),
+        "timezone": "auto",
+        "past_days": spec.past_days,
+        "forecast_days": spec.forecast_days,
+    }
+
+
+def build_delta_params(latitudes, longitudes, spec=None):
+    """Query parameters for an incremental update: current block and hours around now
+
+    ``past_hours``/``forecast_hours`` are relative to each location's own
+    current hour, so one batched call works across timezones (a fixed
+    ``start_hour``/``end_hour`` would not).
+    """
+    spec = spec or FULL_REQUEST
+    return {
+        "latitude": ",".join(str(lat) for lat in latitudes),
+        "longitude": ",".join(str(lon) for lon in longitudes),
+        **_blocks(spec, ("current", "hourly")),
+        "timezone": "auto",
+        "past_hours": config.DELTA_PAST_HOURS,
+        "forecast_hours": min(config.DELTA_FORECAST_HOURS, spec.forecast_days * 24),
+    }
+
+
+def chunk_coordinates(coords, max_locations=None, max_url_length=None, spec=None):
+    """Split coordinates into batches that respect the location and URL limits"""
+    max_locations = max_locations or config.BULK_MAX_LOCATIONS
+    max_url_length = max_url_length or config.BULK_MAX_URL_LENGTH
+    # Everything except the coordinate lists is the same for every batch;
+    # measure it encoded, as sent ("," in the variable lists becomes "%2C")
+    base_length = len(config.FORECAST_URL) + 1 + len(urlencode(build_params([], [], spec)))
+
+    chunk, length = [], base_length
+    for lat, lon in coords:
+        # Each coordinate adds its grid point (see request_forecasts) plus
+        # two separators, "%2C" once percent-encoded
+        cost = sum(len(str(value)) for value in coord_key(lat, lon)) + 6
+        if chunk and (len(chunk) >= max_locations or length + cost > max_url_length):
+            yield chunk
+            chunk, length = [], base_length
+        chunk.append((lat, lon))
+        length += cost
+    if chunk:
+        yield chunk
+
+
+def request_forecasts(coords, priority=INTERACTIVE, delta=False, spec=None, budget=None):
+    """Fetch raw forecast payloads for ``coords`` in one upstream call, in input order
+
+    ``delta`` requests only the incremental window (see build_delta_params);
+    ``budget`` overrides the latency budget (see resilience.fetch_json).
+    """
+    build = build_delta_params if delta else build_params
+    # Ask for the grid point the entry is keyed on (see cache.coord_key)
+    points = [coord_key(lat, lon) for lat, lon in coords]
+    params = build([lat for lat, _ in points], [lon for _, lon in points], spec)
+    # Open-Meteo bills a multi-location request as one call per location
+    payload = fetch_json(config.FORECAST_URL, params=params, priority=priority, cost=len(coords), budget=budget)
+    # A single coordinate comes back as an object, several as a list
+    payloads = payload if isinstance(payload, list) else [payload]
+    if len(payloads) != len(coords):
+        raise ValueError(
+            f"Expected {len(coords)} forecasts from Open-Meteo, got {len(payloads)}"
+        )
+    return payloads
+
+
+def fetch_frames(coords, priority=INTERACTIVE, spec=None, budget=None):
+    """Fetch and decode full forecasts for ``coords`` in one upstream call"""
+    payloads = request_forecasts(coords, priority, spec=spec, budget=budget)
+    fetched_at = time.time()
+    spec = spec or FULL_REQUEST
+    mode = "full" if spec.hourly or spec.daily else "current"
+    inc("weather_hub_forecast_fetches_total", len(coords), mode=mode)
+    with span("frame_decode"):
+        return [WeatherFrame.from_payload({**payload, FULL_FETCHED_AT: fetched_at}) for payload in payloads]
+
+
+def can_update(frame, now=None, spec=None):
+    """Whether ``frame`` (fetched for ``spec``) can be refreshed with a delta instead of a full fetch"""
+    if not config.DELTA_ENABLED:
+        return False
+    now = time.time() if now is None else now
+    if now - frame.meta.get(FULL_FETCHED_AT, 0) >= config.DELTA_MAX_AGE:
+        return False
+    # The series start ``past_days`` before the day of the full fetch; once
+    # the local date changes, the past days and the daily block have moved
+    times = frame.hourly.get("time")
+    if times is None or not len(times):
+        return False
+    today = frame.local_now().astype("datetime64[D]")
+    return times[0].astype("datetime64[D]") == today - np.timedelta64((spec or FULL_REQUEST).past_days, "D")
+
+
+def update_frames(bases, coords, priority=BACKGROUND, spec=None):
+    """Refresh cached ``bases`` of ``coords`` with one incremental upstream call"""
+    payloads = request_forecasts(coords, priority, delta=True, spec=spec)
+    inc("weather_hub_forecast_fetches_total", len(coords), mode="delta")
+    with span("frame_decode"):
+        deltas = [WeatherFrame.from_payload(payload) for payload in payloads]
+    with span("delta_merge"):
+        return [base.updated(delta) for base, delta in zip(bases, deltas)]
+
+
+def refresh_frame(lat, lon, priority=BACKGROUND, spec=None):
+    """A fresh frame for one coordinate, incremental when the cached one allows it"""
+    entry = forecast_cache.get_entry(forecast_key(lat, lon, spec), touch=False)
+    if entry is not None and can_update(entry.value, spec=spec):
+        return update_frames([entry.value], [(lat, lon)], priority, spec)[0]
+    return fetch_frames([(lat, lon)], priority, spec)[0]
+
+
+def get_forecast_entry(lat, lon, spec=None):
+    """Return the cache entry for a coordinate and ``spec`` with stale-while-revalidate
+
+    A fresh entry is returned as is. A stale entry is returned immediately
+    and refreshed in the background; upstream errors during that refresh are
+    logged and the stale entry keeps being served until the hard TTL. Only a
+    miss blocks on the upstream call (for at most the latency budget), and
+    only a miss raises. Concurrent misses for the same key share one
+    upstream call.
+    """
+    return get_entry(forecast_key(lat, lon, spec), lambda priority: refresh_frame(lat, lon, priority, spec))
+
+
+def get_current_entry(lat, lon, spec):
+    """Cache entry for a current-conditions-only ``spec``, for live polling
+
+    Served from current_cache, which is fresh for just under one live
+    polling interval. A stale entry is re-fetched on the spot within
+    ``WEATHER_HUB_LIVE_FETCH_BUDGET``, so each tick shows values fetched on
+    that tick; only if that fails are the last values served (stale) while a
+    background revalidation retries.
+    """
+    return get_entry(
+        forecast_key(lat, lon, spec),
+        lambda priority: fetch_frames([(lat, lon)], priority, spec)[0],
+        source="current",
+        cache=current_cache,
+        refresh_stale=lambda priority: fetch_frames([(lat, lon)], priority, spec, config.LIVE_FETCH_BUDGET)[0],
+    )
+
+
+def get_entry(key, fetch, source="forecast", cache=None, refresh_stale=None):
+    """Stale-while-revalidate lookup of ``key`` (see get_forecast_entry)
+
+    ``fetch(priority)`` returns a fresh WeatherFrame for the key; any data
+    source cached in forecast_cache (or another ``cache``) is served
+    through here. With ``refresh_stale`` (a fetch with a short latency
+    budget) a stale entry is first re-fetched on the spot, and served stale
+    only when that fails.
+    """
+    cache = forecast_cache if cache is None else cache
+    entry = cache.get_entry(key)
+    result = "miss" if entry is None else "stale" if entry.stale else "hit"
+    inc("weather_hub_forecast_cache_requests_total", result=result, source=source)
+    cache.record_lookup(result)
+    if entry is None:
+        return _flights.do((INTERACTIVE, key), lambda: _load(key, fetch, cache))
+    if entry.stale and refresh_stale is not None:
+        try:
+            return _flights.do((INTERACTIVE, key), lambda: _fetch_entry(key, refresh_stale, INTERACTIVE, cache))
+        except Exception:
+            logger.warning("Refreshing %s failed; serving stale data", key, exc_info=True)
+    if entry.stale:
+        schedule_revalidation(key, fetch, cache)
+    return entry
+
+
+def _load(key, fetch, cache):
+    # A flight for this key may have completed between the caller's cache
+    # lookup and this one starting
+    entry = cache.get_entry(key)
+    if entry is not None:
+        return entry
+    return _fetch_entry(key, fetch, INTERACTIVE, cache)
+
+
+def _fetch_entry(key, fetch, priority, cache):
+    # Built here rather than read back: under memory pressure the entry may
+    # already have been evicted again
+    value, fetched_at = fetch(priority), time.time()
+    cache.put(key, value, fetched_at)
+    return CacheEntry(value, fetched_at, False)
+
+
+def schedule_revalidation(key, fetch, cache=None):
+    """Refresh ``key`` in the background with ``fetch`` unless one is pending"""
+    now = time.monotonic()
+    with _revalidate_lock:
+        while _revalidate_after and next(iter(_revalidate_after.values())) <= now:
+            _revalidate_after.popitem(last=False)
+        if key in _revalidating or key in _revalidate_after:
+            return False
+        _revalidating.add(key)
+    _revalidator.submit(_revalidate, key, fetch, forecast_cache if cache is None else cache)
+    return True
+
+
+def _revalidate(key, fetch, cache):
+    try:
+        _flights.do((BACKGROUND, key), lambda: _fetch_entry(key, fetch, BACKGROUND, cache))
+    except Exception:
+        logger.warning("Revalidating %s failed; serving stale data", key, exc_info=True)
+        with _revalidate_lock:
+            _revalidate_after.pop(key, None)
+            _revalidate_after[key] = time.monotonic() + config.REVALIDATE_FAILURE_BACKOFF
+    else:
+        with _revalidate_lock:
+            _revalidate_after.pop(key, None)
+    finally:
+        with _revalidate_lock:
+            _revalidating.discard(key)
+
+
+def refresh_forecasts(coords, priority=BACKGROUND, spec=None):
+    """Re-fetch ``coords`` in batched calls and overwrite their cache entries
+
+    Coordinates whose cached frame allows it get incremental updates, the
+    rest full forecasts. Returns the number of upstream calls made.
+    """
+    incremental, full = [], []
+    for lat, lon in coords:
+        entry = forecast_cache.get_entry(forecast_key(lat, lon, spec), touch=False)
+        if entry is not None and can_update(entry.value, spec=spec):
+            incremental.append(((lat, lon), entry.value))
+        else:
+            full.append((lat, lon))
+
+    calls = 0
+    bases = dict(incremental)
+    for chunk in chunk_coordinates(list(bases), spec=spec):
+        for (lat, lon), frame in zip(chunk, update_frames([bases[c] for c in chunk], chunk, priority, spec)):
+            forecast_cache.put(forecast_key(lat, lon, spec), frame)
+        calls += 1
+    for chunk in chunk_coordinates(full, spec=spec):
+        for (lat, lon), frame in zip(chunk, fetch_frames(chunk, priority, spec)):
+            forecast_cache.put(forecast_key(lat, lon, spec), frame)
+        calls += 1
+    return calls
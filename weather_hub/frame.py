@@ -0,0 +1,302 @@
+"""Columnar, read-only forecast objects shared by every Streamlit session
+
+A WeatherFrame is decoded once when a payload enters the cache:
+
+- ``hourly`` and ``daily`` map variable names to float32 arrays (nulls become
+  NaN) plus a ``time`` column of ``datetime64`` in the location's local time
+- ``current`` maps variable names to floats and ``time`` to a ``datetime64``
+
+Every array has its writeable flag cleared and every block is a read-only
+mapping, so one instance can be handed to any number of concurrent sessions
+without copying and without any session being able to alter it. Chart code
+works on these arrays directly instead of re-parsing the JSON on each rerun.
+
+The hourly series starts ``past_days`` before today, so panels never slice by
+fixed offset. ``hourly_window``/``daily_window``/``day`` locate "now" in the
+location's timezone with a binary search and return zero-copy views.
+``day_hour_cube`` reshapes hourly series into a (day, hour-of-day, variable)
+array for day-by-hour views. It is built on each call and never attached to
+the frame, whose ``nbytes`` the cache budget relies on; callers cache it.
+"""
+from collections import namedtuple
+from types import MappingProxyType
+
+import numpy as np
+
+BLOCKS = ("current", "hourly", "daily")
+
+# Approximate fixed cost of an ndarray object and of a mapping entry, for
+# cache memory accounting
+_ARRAY_OVERHEAD = 112
+_ENTRY_OVERHEAD = 100
+
+# Open-Meteo timestamps are local ISO strings: minutes for current/hourly,
+# dates for daily
+TIME_UNITS = {"current": "m", "hourly": "m", "daily": "D"}
+
+
+def _frozen(array):
+    array.flags.writeable = False
+    return array
+
+
+def _times(values, unit):
+    return _frozen(np.array(values, dtype=f"datetime64[{unit}]"))
+
+
+def _series(values):
+    """Read-only float32 array for one series; nulls become NaN"""
+    return _frozen(np.array([np.nan if v is None else v for v in values], dtype=np.float32))
+
+
+def _scalar(value):
+    return float("nan") if value is None else float(value)
+
+
+def _decode_block(block, unit):
+    columns = {}
+    for name, values in block.items():
+        columns[name] = _times(values, unit) if name == "time" else _series(values)
+    return columns
+
+
+def _local_now(utc_offset_seconds):
+    return np.datetime64("now", "s") + np.timedelta64(int(utc_offset_seconds), "s")
+
+
+class Window:
+    """Zero-copy slice of a block: ``time`` plus one view per series"""
+
+    __slots__ = ("_columns", "_length")
+
+    def __init__(self, columns, start, stop):
+        self._columns = {name: values[start:stop] for name, values in columns.items()}
+        self._length = max(0, stop - start)
+
+    def __getitem__(self, name):
+        """The named series, all-NaN when the upstream omitted it"""
+        if name in self._columns:
+            return self._columns[name]
+        return _frozen(np.full(self._length, np.nan, dtype=np.float32))
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __len__(self):
+        return self._length
+
+    def keys(self):
+        return self._columns.keys()
+
+    @property
+    def time(self):
+        return self._columns.get("time", np.array([], dtype="datetime64[m]"))
+
+
+# Hourly series as ``values[day, hour, variable]``, NaN where no row exists.
+# ``days`` are the local dates of axis 0 (from the date of the first hourly
+# row), ``labels`` their "Sat 10/18" names, ``variables`` the names of axis 2
+DayHourCube = namedtuple("DayHourCube", ["days", "labels", "variables", "values"])
+
+
+def _day_hour_cube(hourly, variables=None):
+    times = hourly.get("time")
+    if variables is None:
+        variables = tuple(name for name in hourly if name != "time")
+    variables = tuple(variables)
+    if times is None or not len(times):
+        empty = np.array([], dtype="datetime64[D]")
+        return DayHourCube(_frozen(empty), (), variables, _frozen(np.empty((0, 24, len(variables)), np.float32)))
+    dates = times.astype("datetime64[D]")
+    first = dates[0]
+    day_index = (dates - first).astype(np.int64)
+    # Local wall-clock hour; a DST-skipped hour stays NaN
+    hour_index = ((times - dates) // np.timedelta64(1, "h")).astype(np.int64)
+    values = np.full((int(day_index[-1]) + 1, 24, len(variables)), np.nan, dtype=np.float32)
+    if variables:
+        columns = [hourly.get(name) for name in variables]
+        values[day_index, hour_index] = np.stack(
+            [np.full(len(times), np.nan, np.float32) if column is None else column for column in columns], axis=-1
+        )
+    days = first + np.arange(values.shape[0])
+    labels = tuple(day.item().strftime("%a %m/%d") for day in days)
+    return DayHourCube(_frozen(days), labels, variables, _frozen(values))
+
+
+def _encode_series(array, unit=None):
+    if array.dtype.kind == "M":
+        return np.datetime_as_string(array, unit=unit).tolist()
+    return [None if np.isnan(v) else round(v, 4) for v in array.astype(np.float64).tolist()]
+
+
+class WeatherFrame:
+    """Immutable columnar current/hourly/daily view of one Open-Meteo forecast"""
+
+    __slots__ = ("meta", "current", "hourly", "daily")
+
+    def __init__(self, meta, current, hourly, daily):
+        object.__setattr__(self, "meta", MappingProxyType(dict(meta)))
+        object.__setattr__(self, "current", MappingProxyType(dict(current)))
+        object.__setattr__(self, "hourly", MappingProxyType(dict(hourly)))
+        object.__setattr__(self, "daily", MappingProxyType(dict(daily)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("WeatherFrame is read-only")
+
+    @classmethod
+    def from_payload(cls, payload):
+        """Decode one location's JSON forecast"""
+        meta = {k: v for k, v in payload.items() if k not in BLOCKS}
+        current = {}
+        for name, value in payload.get("current", {}).items():
+            if name == "time":
+                current[name] = np.datetime64(value, TIME_UNITS["current"])
+            elif name == "interval":
+                current[name] = int(value)
+            else:
+                current[name] = _scalar(value)
+        hourly = _decode_block(payload.get("hourly", {}), TIME_UNITS["hourly"])
+        daily = _decode_block(payload.get("daily", {}), TIME_UNITS["daily"])
+        return cls(meta, current, hourly, daily)
+
+    def to_payload(self):
+        """JSON-compatible dict in the Open-Meteo response layout"""
+        payload = dict(self.meta)
+        payload["current"] = {
+            name: (
+                str(np.datetime_as_string(value, unit=TIME_UNITS["current"])) if name == "time"
+                else None if value != value else value
+            )
+            for name, value in self.current.items()
+        }
+        payload["hourly"] = {
+            name: _encode_series(values, TIME_UNITS["hourly"]) for name, values in self.hourly.items()
+        }
+        payload["daily"] = {
+            name: _encode_series(values, TIME_UNITS["daily"]) for name, values in self.daily.items()
+        }
+        return payload
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by this frame: its arrays plus per-entry overhead"""
+        arrays = [values for block in (self.hourly, self.daily) for values in block.values()]
+        entries = len(self.meta) + len(self.current) + len(arrays)
+        return sum(values.nbytes + _ARRAY_OVERHEAD for values in arrays) + entries * _ENTRY_OVERHEAD
+
+    def series(self, block, name):
+        """A column of ``hourly`` or ``daily``, all-NaN when the upstream omitted it"""
+        columns = getattr(self, block)
+        if name in columns:
+            return columns[name]
+        return _frozen(np.full(len(columns.get("time", ())), np.nan, dtype=np.float32))
+
+    def local_now(self):
+        """Current wall-clock time in the forecast location's timezone"""
+        return _local_now(self.meta.get("utc_offset_seconds", 0))
+
+    def _bounds(self, block, start, stop):
+        times = getattr(self, block).get("time")
+        if times is None:
+            return 0, 0
+        i, j = np.searchsorted(times, [start.astype(times.dtype), stop.astype(times.dtype)])
+        return int(i), int(j)
+
+    def hour_index(self, now=None):
+        """Index of the hourly slot containing ``now`` (local time)"""
+        now = self.local_now() if now is None else now
+        hour = now.astype("datetime64[h]")
+        return self._bounds("hourly", hour, hour)[0]
+
+    def hourly_window(self, start=0, hours=48, now=None):
+        """Hourly rows from ``start`` hours after the current hour, ``hours`` long
+
+        ``hourly_window(0, 48)`` is the next 48 hours including the current
+        one; ``hourly_window(-72, 72)`` is the past 72 hours.
+        """
+        now = self.local_now() if now is None else now
+        first = now.astype("datetime64[h]") + np.timedelta64(start, "h")
+        i, j = self._bounds("hourly", first, first + np.timedelta64(hours, "h"))
+        return Window(self.hourly, i, j)
+
+    def daily_window(self, start=0, days=7, now=None):
+        """Daily rows from ``start`` days after today, ``days`` long"""
+        now = self.local_now() if now is None else now
+        first = now.astype("datetime64[D]") + np.timedelta64(start, "D")
+        i, j = self._bounds("daily", first, first + np.timedelta64(days, "D"))
+        return Window(self.daily, i, j)
+
+    def hourly_range(self, start, stop):
+        """Hourly rows with ``start <= time < stop`` (local ``datetime64`` values)"""
+        i, j = self._bounds("hourly", np.datetime64(start), np.datetime64(stop))
+        return Window(self.hourly, i, j)
+
+    def day(self, n=0, now=None):
+        """Hourly rows of local calendar day ``n`` (0 is today, -1 yesterday)"""
+        now = self.local_now() if now is None else now
+        first = now.astype("datetime64[D]") + np.timedelta64(n, "D")
+        i, j = self._bounds("hourly", first, first + np.timedelta64(1, "D"))
+        return Window(self.hourly, i, j)
+
+    def day_hour_cube(self, variables=None):
+        """``variables`` (default: every hourly series) as a new read-only DayHourCube"""
+        return _day_hour_cube(self.hourly, variables)
+
+    def updated(self, delta):
+        """A copy with ``delta``'s current block and hourly rows written over this one
+
+        ``delta`` is a partial forecast of the same location (a window of
+        hours, no daily block). Its rows land at their matching timestamps;
+        rows outside this frame's time axis are ignored, and every other row,
+        the daily block and the metadata are kept. Shared frames are never
+        written to, so the result gets its own copy of each updated series.
+        """
+        times = self.hourly.get("time")
+        delta_times = delta.hourly.get("time")
+        hourly = dict(self.hourly)
+        if times is not None and delta_times is not None and len(times) and len(delta_times):
+            positions = np.searchsorted(times, delta_times.astype(times.dtype))
+            clipped = np.minimum(positions, len(times) - 1)
+            matched = (positions < len(times)) & (times[clipped] == delta_times)
+            for name, values in delta.hourly.items():
+                if name == "time" or name not in hourly:
+                    continue
+                series = hourly[name].copy()
+                series[positions[matched]] = values[matched]
+                hourly[name] = _frozen(series)
+        current = {**self.current, **delta.current} if delta.current else self.current
+        return WeatherFrame(self.meta, current, hourly, self.daily)
+
+    def merged(self, others, meta=None):
+        """This frame plus other sources' series aligned onto its hourly axis
+
+        ``others`` maps a source name to a WeatherFrame fetched with the same
+        timezone. Their hourly series become ``"<source>.<name>"`` columns,
+        NaN where the source has no row for an hour, and their current values
+        ``"<source>.<name>"`` entries. ``meta`` is merged into ``self.meta``.
+        """
+        times = self.hourly.get("time", np.array([], dtype="datetime64[m]"))
+        hourly = dict(self.hourly)
+        current = dict(self.current)
+        for source, frame in others.items():
+            other_times = frame.hourly.get("time")
+            if other_times is not None and len(times) and len(other_times):
+                positions = np.searchsorted(times, other_times.astype(times.dtype))
+                clipped = np.minimum(positions, len(times) - 1)
+                matched = (positions < len(times)) & (times[clipped] == other_times)
+                for name, values in frame.hourly.items():
+                    if name == "time":
+                        continue
+                    aligned = np.full(len(times), np.nan, dtype=np.float32)
+                    aligned[positions[matched]] = values[matched]
+                    hourly[f"{source}.{name}"] = _frozen(aligned)
+            for name, value in frame.current.items():
+                if name not in ("time", "interval"):
+                    current[f"{source}.{name}"] = value
+        return WeatherFrame({**self.meta, **(meta or {})}, current, hourly, self.daily)
+
+    def __repr__(self):
+        return (
+            f"WeatherFrame(lat={self.meta.get('latitude')}, lon={self.meta.get('longitude')}, "
+            f"hours={len(self.hourly.get('time', ()))}, days={len(self.daily.get('time', ()))})"
+        )
@@ -0,0 +1,121 @@
+"""Declarative weather alerts evaluated over whole forecast series
+
+A Rule is a threshold on one ``hourly`` or ``daily`` variable plus the
+shortest run of consecutive rows that counts as an event (``min_rows``).
+``evaluate`` compares every rule of a block against its series from the
+current hour (or today) to the end of the horizon, stacks the results into
+one (rule, row) boolean mask and finds every run of True with a single
+``diff`` over it. Each run long enough becomes a time-ranged Alert, e.g.
+"wind > 30 km/h Tue 14:00–20:00". Nothing loops over rows in Python, so a
+week of hourly data is checked in well under a millisecond.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from .requirements import Requirement
+
+# ``op`` is one of OPERATORS; "between" takes a (low, high) ``threshold``,
+# both ends inclusive. ``label`` names the variable in alert text
+Rule = namedtuple(
+    "Rule",
+    ["name", "icon", "block", "variable", "label", "op", "threshold", "unit", "min_rows", "advice"],
+    defaults=("", 1, ""),
+)
+
+# ``start`` and ``stop`` are the local times of the first row and of the row
+# after the last one; ``peak`` is the most extreme value in the run
+Alert = namedtuple("Alert", ["rule", "start", "stop", "peak"])
+
+OPERATORS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+}
+
+# Row length of each block, for the exclusive end of a run
+STEPS = {"hourly": np.timedelta64(1, "h"), "daily": np.timedelta64(1, "D")}
+
+
+def _mask(rule, values):
+    """Rows of ``values`` meeting ``rule``; NaN never does"""
+    if rule.op == "between":
+        low, high = rule.threshold
+        return (values >= low) & (values <= high)
+    return OPERATORS[rule.op](values, rule.threshold)
+
+
+def _runs(mask):
+    """(rule index, first row, stop row) of every run of True in a 2-D mask"""
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    # Row-major order pairs every rising edge with the falling edge after it
+    rows, starts = np.nonzero(edges == 1)
+    _, stops = np.nonzero(edges == -1)
+    return rows, starts, stops
+
+
+def _evaluate_block(window, rules, step):
+    times = window.time
+    if not rules or not len(times):
+        return []
+    values = [window[rule.variable] for rule in rules]
+    mask = np.stack([_mask(rule, series) for rule, series in zip(rules, values)])
+    rows, starts, stops = _runs(mask)
+    min_rows = np.array([rule.min_rows for rule in rules])
+    keep = stops - starts >= min_rows[rows]
+    alerts = []
+    for row, start, stop in zip(rows[keep].tolist(), starts[keep].tolist(), stops[keep].tolist()):
+        rule = rules[row]
+        run = values[row][start:stop]
+        peak = float(np.nanmin(run) if rule.op in ("<", "<=") else np.nanmax(run))
+        alerts.append(Alert(rule, times[start], times[stop - 1] + step, peak))
+    return alerts
+
+
+def evaluate(frame, rules, now=None):
+    """Every alert of ``rules`` from the current hour and today onwards, by start time"""
+    alerts = []
+    for block in STEPS:
+        block_rules = [rule for rule in rules if rule.block == block]
+        length = len(getattr(frame, block).get("time", ()))
+        if block == "hourly":
+            window = frame.hourly_window(0, length, now=now)
+        else:
+            window = frame.daily_window(0, length, now=now)
+        alerts.extend(_evaluate_block(window, block_rules, STEPS[block]))
+    alerts.sort(key=lambda alert: alert.start)
+    return alerts
+
+
+def requirement(rules, days):
+    """The Requirement covering every variable ``rules`` read over ``days`` days"""
+    variables = {"hourly": {}, "daily": {}}
+    for rule in rules:
+        variables[rule.block].setdefault(rule.variable, None)
+    return Requirement(hourly=tuple(variables["hourly"]), daily=tuple(variables["daily"]), days=days)
+
+
+def condition(rule):
+    """Rule threshold as text: "wind > 30 km/h", "temperature 20–25 °C" """
+    unit = f" {rule.unit}" if rule.unit else ""
+    if rule.op == "between":
+        low, high = rule.threshold
+        return f"{rule.label} {low:g}–{high:g}{unit}"
+    return f"{rule.label} {rule.op} {rule.threshold:g}{unit}"
+
+
+def when(alert):
+    """Alert time range as text: "Tue 14:00–20:00", "Tue 22:00–Wed 03:00", "Wed–Thu" """
+    start = alert.start.item()
+    if alert.rule.block == "daily":
+        last = (alert.stop - STEPS["daily"]).item()
+        return start.strftime("%a") if last == start else f"{start:%a}–{last:%a}"
+    stop = alert.stop.item()
+    # A run ending at midnight ends on its start day ("Tue 18:00–00:00")
+    last = alert.stop - np.timedelta64(1, "m")
+    if last.item().date() == start.date():
+        return f"{start:%a %H:%M}–{stop:%H:%M}"
+    return f"{start:%a %H:%M}–{stop:%a %H:%M}"
@@ -0,0 +1,248 @@
+"""Timing spans, counters and metrics export for the dashboard pipeline
+
+Stages of a rerun are wrapped in ``span("name")``. Every span feeds a
+process-wide summary (count, sum and a sliding window for p50/p90/p99) and,
+when it runs inside ``rerun()``, the per-rerun breakdown shown by the debug
+panel. Counters track cache hits/misses and upstream traffic; gauges hold
+point-in-time values such as the remaining upstream quota.
+
+The per-rerun span list lives in a context variable, so work handed to a
+thread pool with ``run_in_context`` (hedged upstream attempts, concurrent
+source fetches) still records into the rerun that started it.
+
+Two optional exports, both plain files so nothing has to listen on a port:
+
+- ``WEATHER_HUB_METRICS_JSONL``: one JSON line per rerun with its stages
+- ``WEATHER_HUB_METRICS_PROM``: Prometheus text format, rewritten at most every
+  ``WEATHER_HUB_METRICS_PROM_INTERVAL`` seconds (node_exporter textfile style)
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from . import config
+
+
+class Summary:
+    """Count, sum and a sliding window of recent observations"""
+
+    def __init__(self, window):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.samples.append(value)
+
+    def quantile(self, q):
+        if not self.samples:
+            return float("nan")
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+class Registry:
+    """Thread-safe store of counters, gauges and summaries, keyed by name and labels"""
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, window=None):
+        self.window = window or config.METRICS_WINDOW
+        self._counters = {}
+        self._gauges = {}
+        self._summaries = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                summary = self._summaries[key] = Summary(self.window)
+            summary.observe(value)
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0)
+
+    def gauge(self, name, **labels):
+        with self._lock:
+            return self._gauges.get((name, _label_key(labels)))
+
+    def snapshot(self):
+        """Counters, gauges and summary quantiles as plain JSON-compatible data"""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            gauges = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._gauges.items())
+            ]
+            summaries = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": summary.count,
+                    "sum": summary.total,
+                    **{f"p{int(q * 100)}": summary.quantile(q) for q in self.QUANTILES},
+                }
+                for (name, labels), summary in sorted(self._summaries.items())
+            ]
+        return {"counters": counters, "gauges": gauges, "summaries": summaries}
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            seen = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} counter")
+                    seen.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} gauge")
+                    seen.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+            for (name, labels), summary in sorted(self._summaries.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} summary")
+                    seen.add(name)
+                for q in self.QUANTILES:
+                    lines.append(f"{name}{_format_labels(labels, [('quantile', str(q))])} {summary.quantile(q)}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {summary.total}")
+                lines.append(f"{name}_count{_format_labels(labels)} {summary.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+
+registry = Registry()
+_spans = contextvars.ContextVar("weather_hub_spans", default=None)
+_export_lock = threading.Lock()
+_last_prom_write = 0.0
+
+
+def inc(name, value=1, **labels):
+    """Increment a process-wide counter"""
+    registry.inc(name, value, **labels)
+
+
+def set_gauge(name, value, **labels):
+    """Set a process-wide gauge"""
+    registry.set(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    """Record one observation in a process-wide summary"""
+    registry.observe(name, value, **labels)
+
+
+@contextmanager
+def span(stage, **labels):
+    """Time one pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe("weather_hub_stage_seconds", elapsed, stage=stage, **labels)
+        spans = _spans.get()
+        if spans is not None:
+            spans.append({"stage": stage, **labels, "seconds": elapsed})
+
+
+def current_spans():
+    """Spans recorded so far in the current rerun"""
+    return list(_spans.get() or ())
+
+
+def run_in_context(fn):
+    """``fn`` bound to a copy of the caller's context, for submitting to a pool
+
+    Spans the pool thread records then land in the caller's rerun. A context
+    can only be entered by one thread at a time, so bind once per submission.
+    """
+    context = contextvars.copy_context()
+    return functools.partial(context.run, fn)
+
+
+@contextmanager
+def rerun(**labels):
+    """Collect the spans of one script run and record its total latency
+
+    Inside another run (a fragment executing as part of a full script run)
+    this adds nothing; on its own (a fragment-only rerun) it records that
+    run, its ``labels`` telling it apart from full reruns.
+    """
+    if _spans.get() is not None:
+        yield
+        return
+    token = _spans.set([])
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        spans = _spans.get()
+        _spans.reset(token)
+        registry.observe("weather_hub_rerun_seconds", elapsed, **labels)
+        _export({"ts": time.time(), "seconds": elapsed, **labels, "spans": spans})
+
+
+def _export(record):
+    global _last_prom_write
+    if config.METRICS_JSONL_PATH:
+        line = json.dumps(record, separators=(",", ":"))
+        with _export_lock, open(config.METRICS_JSONL_PATH, "a", encoding="utf-8") as fh:
+            fh.write(line + "\n")
+    if config.METRICS_PROM_PATH:
+        now = time.monotonic()
+        with _export_lock:
+            if now - _last_prom_write < config.METRICS_PROM_INTERVAL:
+                return
+            _last_prom_write = now
+        write_prometheus(config.METRICS_PROM_PATH)
+
+
+def write_prometheus(path):
+    """Atomically replace ``path`` with the current Prometheus text dump"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(registry.render_prometheus())
+    os.replace(tmp, path)
@@ -0,0 +1,259 @@
+"""Client-side token bucket in front of every Open-Meteo call
+
+Open-Meteo's free tier enforces per-minute and per-day call limits. Rather
+than finding out through 429s, every upstream attempt first takes tokens
+from a bucket that refills at ``WEATHER_HUB_RATE_LIMIT_PER_MINUTE`` and
+holds at most ``WEATHER_HUB_RATE_LIMIT_BURST``, and is counted against a
+daily quota. A multi-location call costs one token per location.
+
+Interactive requests (a visitor waiting on a cache miss) take priority over
+background ones (revalidation, scheduled refresh): background callers may not
+spend the reserved share of the bucket or of the daily quota, and in-process
+they also wait while any interactive caller is waiting.
+
+The bucket lives in the process by default. ``WEATHER_HUB_RATE_LIMIT_BACKEND=
+sqlite`` keeps it in a file, so every process on the host shares one budget.
+"""
+import threading
+import time
+
+from . import config
+from .metrics import inc, observe, set_gauge
+from .sqlite import ThreadConnections
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+
+class RateLimited(Exception):
+    """The upstream call budget is exhausted"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# ========================================
+# STATE STORES
+# ========================================
+# A store holds one bucket state and applies ``update(fn)`` atomically:
+# ``fn(state)`` returns ``(new_state, result)`` and ``update`` returns result.
+# State: (tokens, updated, minute, minute_used, day, day_used), where minute
+# and day are epoch minute/day numbers (UTC).
+
+def _initial_state(capacity):
+    return (capacity, time.time(), 0, 0.0, 0, 0.0)
+
+
+class MemoryStore:
+    """Bucket state private to the process"""
+
+    def __init__(self, capacity):
+        self._state = _initial_state(capacity)
+        self._lock = threading.Lock()
+
+    def update(self, fn):
+        with self._lock:
+            self._state, result = fn(self._state)
+        return result
+
+
+class SQLiteStore:
+    """Bucket state shared by every process that opens the same file"""
+
+    def __init__(self, capacity, path=None):
+        self.path = path or config.RATE_LIMIT_PATH
+        # Autocommit, so update() controls the transaction itself
+        self._connections = ThreadConnections(self.path, isolation_level=None)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS bucket ("
+            " id INTEGER PRIMARY KEY CHECK (id = 0),"
+            " tokens REAL NOT NULL, updated REAL NOT NULL,"
+            " minute INTEGER NOT NULL, minute_used REAL NOT NULL,"
+            " day INTEGER NOT NULL, day_used REAL NOT NULL)"
+        )
+        conn.execute("INSERT OR IGNORE INTO bucket VALUES (0, ?, ?, ?, ?, ?, ?)", _initial_state(capacity))
+
+    def _connect(self):
+        return self._connections.get()
+
+    def update(self, fn):
+        conn = self._connect()
+        # IMMEDIATE takes the write lock up front, so read-modify-write is atomic
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            state = conn.execute(
+                "SELECT tokens, updated, minute, minute_used, day, day_used FROM bucket WHERE id = 0"
+            ).fetchone()
+            state, result = fn(tuple(state))
+            conn.execute(
+                "UPDATE bucket SET tokens = ?, updated = ?, minute = ?, minute_used = ?,"
+                " day = ?, day_used = ? WHERE id = 0",
+                state,
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+
+STORES = {
+    "memory": MemoryStore,
+    "sqlite": SQLiteStore,
+}
+
+
+def make_store(capacity, name=None):
+    """Build the store named by ``WEATHER_HUB_RATE_LIMIT_BACKEND``"""
+    name = (name or config.RATE_LIMIT_BACKEND).lower()
+    if name not in STORES:
+        raise ValueError(f"Unknown rate limit backend {name!r}; expected one of {sorted(STORES)}")
+    return STORES[name](capacity)
+
+
+# ========================================
+# LIMITER
+# ========================================
+class RateLimiter:
+    """Token bucket plus daily quota with interactive/background priorities
+
+    ``per_minute <= 0`` disables the bucket and ``per_day <= 0`` the daily
+    quota; usage is still counted either way.
+    """
+
+    def __init__(self, per_minute=None, burst=None, per_day=None, reserve=None, store=None):
+        self.per_minute = config.RATE_LIMIT_PER_MINUTE if per_minute is None else per_minute
+        self.capacity = config.RATE_LIMIT_BURST if burst is None else burst
+        self.per_day = config.RATE_LIMIT_PER_DAY if per_day is None else per_day
+        self.reserve = config.RATE_LIMIT_INTERACTIVE_RESERVE if reserve is None else reserve
+        self.rate = self.per_minute / 60.0
+        self.store = store if store is not None else make_store(self.capacity)
+        self._cond = threading.Condition()
+        self._interactive_waiting = 0
+        set_gauge("weather_hub_upstream_quota_limit", self.per_minute, window="minute")
+        set_gauge("weather_hub_upstream_quota_limit", self.per_day, window="day")
+
+    def _limits(self, priority):
+        """Bucket floor and daily ceiling for ``priority``"""
+        if priority == BACKGROUND:
+            return self.capacity * self.reserve, self.per_day * (1 - self.reserve)
+        return 0.0, self.per_day
+
+    def _take(self, state, now, cost, priority):
+        tokens, updated, minute, minute_used, day, day_used = state
+        tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+        if minute != int(now // 60):
+            minute, minute_used = int(now // 60), 0.0
+        if day != int(now // 86400):
+            day, day_used = int(now // 86400), 0.0
+        floor, day_limit = self._limits(priority)
+
+        result = None
+        if self.per_day > 0 and day_used + cost > day_limit:
+            result = RateLimited(
+                f"Daily Open-Meteo quota reached ({day_used:.0f}/{self.per_day:.0f} calls)",
+                retry_after=(day + 1) * 86400 - now,
+            )
+        elif self.rate > 0:
+            # A call larger than the bucket could never be admitted; let it
+            # through once the bucket is full instead
+            need = min(cost, self.capacity - floor)
+            if tokens - need < floor:
+                result = (floor + need - tokens) / self.rate
+            else:
+                tokens -= need
+        if result is None:
+            minute_used += cost
+            day_used += cost
+        return (tokens, now, minute, minute_used, day, day_used), result
+
+    def acquire(self, priority=INTERACTIVE, cost=1, timeout=None):
+        """Block until ``cost`` calls may be made, or raise RateLimited
+
+        Waits at most ``timeout`` seconds (by default the configured maximum
+        wait for the priority).
+        """
+        if timeout is None:
+            timeout = (
+                config.RATE_LIMIT_BACKGROUND_MAX_WAIT if priority == BACKGROUND
+                else config.RATE_LIMIT_MAX_WAIT
+            )
+        start = time.monotonic()
+        deadline = start + timeout
+        interactive = priority != BACKGROUND
+
+        def take(state):
+            state, result = self._take(state, time.time(), cost, priority)
+            return state, (result, state)
+
+        with self._cond:
+            if interactive:
+                self._interactive_waiting += 1
+        try:
+            while True:
+                with self._cond:
+                    yielding = not interactive and self._interactive_waiting > 0
+                if yielding:
+                    wait = 1.0 / max(self.rate, 1.0)
+                else:
+                    wait, state = self.store.update(take)
+                if isinstance(wait, RateLimited):
+                    inc("weather_hub_rate_limit_rejected_total", priority=priority, reason="daily_quota")
+                    raise wait
+                if wait is None:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    inc("weather_hub_rate_limit_rejected_total", priority=priority, reason="timeout")
+                    raise RateLimited(
+                        f"Open-Meteo call budget exhausted; retry in {wait:.1f}s", retry_after=wait
+                    )
+                with self._cond:
+                    self._cond.wait(min(wait, remaining))
+        finally:
+            with self._cond:
+                if interactive:
+                    self._interactive_waiting -= 1
+                self._cond.notify_all()
+
+        observe("weather_hub_rate_limit_wait_seconds", time.monotonic() - start, priority=priority)
+        inc("weather_hub_upstream_quota_consumed_total", cost, priority=priority)
+        # From the state the acquiring transaction wrote, not a second one
+        self._publish(state)
+
+    def drain(self):
+        """Empty the bucket after the upstream answered 429 despite our budget"""
+        def empty(state):
+            # A zero-cost take brings the refill and the windows up to now
+            state, _ = self._take(state, time.time(), 0, INTERACTIVE)
+            state = (min(state[0], 0.0),) + state[1:]
+            return state, state
+
+        self._publish(self.store.update(empty))
+
+    def usage(self):
+        """Current ``{"tokens", "minute", "day"}`` usage (refilled to now)"""
+        def peek(state):
+            tokens, updated, minute, minute_used, day, day_used = state
+            now = time.time()
+            tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+            return state, {
+                "tokens": tokens,
+                "minute": minute_used if minute == int(now // 60) else 0.0,
+                "day": day_used if day == int(now // 86400) else 0.0,
+            }
+
+        return self.store.update(peek)
+
+    def _publish(self, state):
+        """Export a bucket state the caller's transaction just read or wrote"""
+        tokens, _, _, minute_used, _, day_used = state
+        set_gauge("weather_hub_rate_limit_tokens", tokens)
+        set_gauge("weather_hub_upstream_quota_used", minute_used, window="minute")
+        set_gauge("weather_hub_upstream_quota_used", day_used, window="day")
+
+
+rate_limiter = RateLimiter()
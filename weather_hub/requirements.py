@@ -0,0 +1,67 @@
+"""Panel data requirements and the minimal upstream request covering them
+
+Every panel declares what it draws as a Requirement: the data source, the
+variables it reads at each resolution (``current``, ``hourly``, ``daily``)
+and its horizon, ``hours`` of hourly rows from the current hour and ``days``
+of daily rows from today. ``combine`` merges the declarations of all panels
+on a page into one RequestSpec per source: the union of the variables and
+the shortest ``forecast_days`` that covers every horizon. Nothing a panel
+does not read is requested, decoded or cached.
+
+A spec's ``signature`` is part of the cache key, so pages (or releases)
+declaring different requirements never serve each other's payloads.
+"""
+import hashlib
+from collections import namedtuple
+
+BLOCKS = ("current", "hourly", "daily")
+
+Requirement = namedtuple(
+    "Requirement",
+    ["source", "current", "hourly", "daily", "hours", "days", "past_days"],
+    defaults=("forecast", (), (), (), 0, 0, 0),
+)
+
+
+class RequestSpec(namedtuple("RequestSpec", ["current", "hourly", "daily", "past_days", "forecast_days"])):
+    """Variables per block plus the day range of one source's request"""
+
+    __slots__ = ()
+
+    @property
+    def signature(self):
+        spec = "|".join([
+            ",".join(self.current), ",".join(self.hourly), ",".join(self.daily),
+            str(self.past_days), str(self.forecast_days),
+        ])
+        return hashlib.sha1(spec.encode("utf-8")).hexdigest()[:12]
+
+
+def days_for_hours(hours):
+    """Forecast days needed to hold ``hours`` hourly rows starting at any hour of today"""
+    return -(-(hours + 23) // 24) if hours > 0 else 0
+
+
+def combine(requirements):
+    """Minimal RequestSpec per source covering every requirement
+
+    Variables keep the order they were first declared in, so the same
+    declarations always produce the same request and signature.
+    """
+    merged = {}
+    for requirement in requirements:
+        blocks, horizon = merged.setdefault(
+            requirement.source, ({block: {} for block in BLOCKS}, {"days": 1, "past_days": 0})
+        )
+        for block in BLOCKS:
+            for name in getattr(requirement, block):
+                blocks[block].setdefault(name, None)
+        horizon["days"] = max(horizon["days"], requirement.days, days_for_hours(requirement.hours))
+        horizon["past_days"] = max(horizon["past_days"], requirement.past_days)
+    return {
+        source: RequestSpec(
+            tuple(blocks["current"]), tuple(blocks["hourly"]), tuple(blocks["daily"]),
+            horizon["past_days"], horizon["days"],
+        )
+        for source, (blocks, horizon) in merged.items()
+    }
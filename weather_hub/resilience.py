@@ -0,0 +1,196 @@
+"""Latency budget, hedged requests and circuit breaker for upstream fetches
+
+``fetch_json`` wraps ``client.get_json`` so that one slow Open-Meteo response
+cannot stall a page render:
+
+- Interactive fetches get a latency budget (``WEATHER_HUB_LATENCY_BUDGET``)
+  covering rate-limit waits, retries and backoff; when it runs out the fetch
+  fails with LatencyBudgetExceeded instead of waiting on the upstream.
+- If the first attempt has not answered after the observed p95 upstream
+  latency, a duplicate (hedged) request is sent and whichever answers first
+  wins. The loser is left to finish and its result is dropped.
+- A circuit breaker opens after ``WEATHER_HUB_BREAKER_FAILURES`` consecutive
+  failures and rejects calls for ``WEATHER_HUB_BREAKER_COOLDOWN`` seconds, so a
+  failing upstream is not called at all. Callers keep serving cached (stale)
+  forecasts meanwhile; after the cool-down one probe call decides whether the
+  circuit closes again.
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from . import config
+from .client import LatencyBudgetExceeded, get_json
+from .metrics import Summary, inc, run_in_context, set_gauge
+from .ratelimit import INTERACTIVE, RateLimited
+
+
+class CircuitOpen(Exception):
+    """The upstream circuit is open; the call was not attempted"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Weather service is unavailable; retrying in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+# ========================================
+# CIRCUIT BREAKER
+# ========================================
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def is_failure(error):
+    """Whether ``error`` says the upstream is unhealthy (not just our request)"""
+    if isinstance(error, (CircuitOpen, RateLimited)):
+        return False
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, (requests.RequestException, TimeoutError, ValueError))
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a cool-down and a single half-open probe"""
+
+    def __init__(self, name, failure_threshold=None, cooldown=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or config.BREAKER_FAILURES
+        self.cooldown = config.BREAKER_COOLDOWN if cooldown is None else cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._publish()
+
+    def _publish(self):
+        set_gauge("weather_hub_circuit_state", STATE_VALUES[self.state], circuit=self.name)
+
+    def _transition(self, state):
+        if state != self.state:
+            self.state = state
+            inc("weather_hub_circuit_transitions_total", circuit=self.name, state=state)
+            self._publish()
+
+    def allow(self):
+        """Admit a call or raise CircuitOpen"""
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + self.cooldown - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpen(remaining)
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    raise CircuitOpen(self.cooldown)
+                self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self._transition(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def release(self):
+        """Give back a half-open probe slot without a verdict"""
+        with self._lock:
+            self._probing = False
+
+
+# ========================================
+# HEDGED FETCH
+# ========================================
+_latencies = Summary(config.METRICS_WINDOW)
+_latency_lock = threading.Lock()
+_hedger = ThreadPoolExecutor(max_workers=config.HEDGE_CONCURRENCY, thread_name_prefix="upstream-hedge")
+breaker = CircuitBreaker("open_meteo")
+
+
+def hedge_delay():
+    """Seconds to wait before hedging: observed p95 once enough samples exist"""
+    with _latency_lock:
+        if len(_latencies.samples) < config.HEDGE_MIN_SAMPLES:
+            return config.HEDGE_DEFAULT_DELAY
+        return max(config.HEDGE_MIN_DELAY, _latencies.quantile(0.95))
+
+
+def _attempt(url, params, priority, cost, deadline):
+    start = time.monotonic()
+    result = get_json(url, params=params, priority=priority, cost=cost, deadline=deadline)
+    with _latency_lock:
+        _latencies.observe(time.monotonic() - start)
+    return result
+
+
+def fetch_json(url, params=None, priority=INTERACTIVE, cost=1, budget=None, circuit=None):
+    """``get_json`` behind a circuit breaker, with hedging and a latency budget
+
+    Interactive fetches default to ``WEATHER_HUB_LATENCY_BUDGET`` and are
+    hedged; background fetches have no budget and are never hedged.
+    ``circuit`` defaults to the forecast API's breaker.
+    """
+    circuit = circuit or breaker
+    interactive = priority == INTERACTIVE
+    if budget is None and interactive:
+        budget = config.LATENCY_BUDGET
+    deadline = time.monotonic() + budget if budget else None
+
+    circuit.allow()
+    try:
+        result = _hedged(url, params, priority, cost, deadline, hedge=interactive and config.HEDGE_ENABLED)
+    except Exception as e:
+        if is_failure(e):
+            circuit.record_failure()
+        else:
+            circuit.release()
+        raise
+    circuit.record_success()
+    return result
+
+
+def _hedged(url, params, priority, cost, deadline, hedge):
+    if not hedge:
+        return get_json(url, params=params, priority=priority, cost=cost, deadline=deadline)
+
+    first = _hedger.submit(run_in_context(_attempt), url, params, priority, cost, deadline)
+    pending = {first}
+    hedged = False
+    error = None
+    while pending:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            break
+        timeout = remaining
+        if not hedged:
+            timeout = hedge_delay() if remaining is None else min(hedge_delay(), remaining)
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                error = e
+                continue
+            if future is not first:
+                inc("weather_hub_hedged_requests_total", outcome="won")
+            return result
+        # Hedge a slow attempt only; a failed one has already been retried
+        if not hedged and pending:
+            hedged = True
+            inc("weather_hub_hedged_requests_total", outcome="launched")
+            pending.add(_hedger.submit(run_in_context(_attempt), url, params, priority, cost, deadline))
+
+    if not pending:
+        raise error
+    inc("weather_hub_latency_budget_exceeded_total")
+    raise LatencyBudgetExceeded("Open-Meteo did not answer within the latency budget")
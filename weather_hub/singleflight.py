@@ -0,0 +1,50 @@
+"""Single-flight coalescing of concurrent calls for the same key
+
+When a popular forecast expires, every session rerunning at that moment
+misses together. ``SingleFlight.do(key, fn)`` lets the first caller run
+``fn`` while later callers for the same key block on that call and share its
+result (or its exception), so the upstream sees one request instead of a herd.
+Coalescing is per process; with the shared SQLite cache, other processes
+see the result through the cache once it has been written.
+"""
+import threading
+from concurrent.futures import Future
+
+from .metrics import inc
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share it"""
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Return ``fn()``, or the result of the call already in flight for ``key``"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            inc("weather_hub_singleflight_calls_total", flight=self.name, role="follower")
+            return future.result()
+
+        inc("weather_hub_singleflight_calls_total", flight=self.name, role="leader")
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,174 @@
+"""Concurrent multi-source fetch: forecast, air quality and marine data
+
+Open-Meteo serves air quality (pollutants, AQI, UV detail) and marine
+(wave and swell height) data from separate endpoints. ``get_dataset_entry``
+looks every source up at once on an asyncio event loop, each on the shared
+pooled HTTP session in a worker thread, so a page waits for the slowest
+source rather than the sum of all of them.
+
+Each source is cached, coalesced and revalidated like the forecast (see
+forecast.get_entry) and has its own timeout and circuit breaker. The
+forecast is required; an extra source that fails or runs out of time is left
+out of the dataset (and listed in ``meta["sources"]``) instead of failing
+the page. The result is one WeatherFrame: the forecast plus every extra
+source's hourly series aligned onto the forecast's hourly time axis as
+``"<source>.<variable>"`` columns.
+
+What each source is asked for comes from a request plan, the RequestSpec per
+source name that weather_hub.requirements.combine builds from the panels'
+declarations; a source no panel needs is not called at all.
+"""
+import asyncio
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from . import config
+from .cache import CacheEntry, MemoryBackend, coord_key, forecast_cache
+from .forecast import FULL_REQUEST, forecast_key, get_entry, get_forecast_entry
+from .frame import WeatherFrame
+from .metrics import inc, observe, run_in_context, set_gauge
+from .ratelimit import BACKGROUND, INTERACTIVE
+from .resilience import CircuitBreaker, fetch_json
+
+Source = namedtuple("Source", ["name", "url", "timeout", "breaker"])
+
+AIR_QUALITY = Source(
+    name="air_quality",
+    url=config.AIR_QUALITY_URL,
+    timeout=config.AIR_QUALITY_TIMEOUT,
+    breaker=CircuitBreaker("air_quality"),
+)
+MARINE = Source(
+    name="marine",
+    url=config.MARINE_URL,
+    timeout=config.MARINE_TIMEOUT,
+    breaker=CircuitBreaker("marine"),
+)
+SOURCES = {source.name: source for source in (AIR_QUALITY, MARINE)}
+
+_executor = ThreadPoolExecutor(max_workers=config.SOURCE_CONCURRENCY, thread_name_prefix="source-fetch")
+# Merged datasets by version, bounded in bytes like the forecast cache
+_merged = MemoryBackend(max_bytes=config.MERGED_MEMORY_MAX_BYTES, sizeof=lambda frame: frame.nbytes)
+_merged_lock = threading.Lock()
+
+
+def source_key(source, lat, lon, spec):
+    """Cache key: rounded coordinate, source name and the signature of ``spec``"""
+    return coord_key(lat, lon) + (source.name, spec.signature)
+
+
+def build_source_params(source, lat, lon, spec):
+    lat, lon = coord_key(lat, lon)
+    params = {"latitude": str(lat), "longitude": str(lon)}
+    for block in ("current", "hourly"):
+        if getattr(spec, block):
+            params[block] = ",".join(getattr(spec, block))
+    params.update(timezone="auto", past_days=spec.past_days, forecast_days=spec.forecast_days)
+    return params
+
+
+def fetch_source_frame(source, lat, lon, spec, priority=INTERACTIVE):
+    """Fetch and decode one location from ``source``"""
+    payload = fetch_json(
+        source.url,
+        params=build_source_params(source, lat, lon, spec),
+        priority=priority,
+        budget=source.timeout if priority == INTERACTIVE else None,
+        circuit=source.breaker,
+    )
+    return WeatherFrame.from_payload(payload)
+
+
+def get_source_entry(source, lat, lon, spec):
+    """Stale-while-revalidate cache entry for one source, coordinate and spec"""
+    return get_entry(
+        source_key(source, lat, lon, spec),
+        lambda priority: fetch_source_frame(source, lat, lon, spec, priority),
+        source=source.name,
+    )
+
+
+def refresh_source(source, lat, lon, spec, priority=BACKGROUND):
+    """Re-fetch one location from ``source`` and overwrite its cache entry"""
+    frame = fetch_source_frame(source, lat, lon, spec, priority)
+    forecast_cache.put(source_key(source, lat, lon, spec), frame)
+
+
+def _timed(name, fn, *args):
+    start = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        observe("weather_hub_source_seconds", time.perf_counter() - start, source=name)
+
+
+async def _gather(lat, lon, forecast_spec, extras):
+    loop = asyncio.get_running_loop()
+
+    def lookup(name, fn, *args):
+        return loop.run_in_executor(_executor, run_in_context(_timed), name, fn, *args)
+
+    forecast = lookup("forecast", get_forecast_entry, lat, lon, forecast_spec)
+    # The worker keeps running past a timeout, bounded by the source's own
+    # latency budget; its result still lands in the cache for the next rerun
+    lookups = [
+        asyncio.wait_for(lookup(source.name, get_source_entry, source, lat, lon, spec), source.timeout)
+        for source, spec in extras
+    ]
+    results = await asyncio.gather(forecast, *lookups, return_exceptions=True)
+    return results[0], dict(zip((source.name for source, _ in extras), results[1:]))
+
+
+def get_dataset_entry(lat, lon, plan=None):
+    """Forecast merged with the extra sources in ``plan``, fetched concurrently
+
+    ``plan`` maps source names ("forecast" and keys of SOURCES) to
+    RequestSpecs; without one only the full forecast is fetched. Returns a
+    CacheEntry whose value is the merged WeatherFrame, whose ``fetched_at``
+    is that of the newest part (so it changes whenever any part is
+    refreshed) and which is stale if any part is. Raises only if the
+    forecast itself cannot be served.
+    """
+    plan = dict(plan or {"forecast": FULL_REQUEST})
+    forecast_spec = plan.pop("forecast", None) or FULL_REQUEST
+    unknown = sorted(set(plan) - set(SOURCES))
+    if unknown:
+        raise ValueError(f"Unknown data source(s) {unknown}; expected one of {sorted(SOURCES)}")
+    extras = [(SOURCES[name], spec) for name, spec in sorted(plan.items())]
+    forecast, results = asyncio.run(_gather(lat, lon, forecast_spec, extras))
+    if isinstance(forecast, BaseException):
+        raise forecast
+
+    parts, status = {}, {}
+    for name, result in results.items():
+        if isinstance(result, BaseException):
+            inc("weather_hub_source_failures_total", source=name, error=type(result).__name__)
+            status[name] = {"error": str(result) or type(result).__name__}
+        else:
+            parts[name] = result
+            status[name] = {"fetched_at": result.fetched_at}
+
+    version = (forecast_key(lat, lon, forecast_spec), forecast.fetched_at) + tuple(
+        (name, plan[name].signature, entry.fetched_at) for name, entry in sorted(parts.items())
+    )
+    with _merged_lock:
+        record = _merged.get(version)
+    if record is not None:
+        merged = record[0]
+    else:
+        merged = forecast.value.merged(
+            {name: entry.value for name, entry in parts.items()}, meta={"sources": status}
+        )
+        with _merged_lock:
+            for reason in _merged.set(version, merged, time.time(), config.FORECAST_HARD_TTL):
+                inc("weather_hub_forecast_cache_evictions_total", cache="merged", reason=reason)
+            size = _merged.bytes
+        set_gauge("weather_hub_forecast_cache_bytes", size, cache="merged")
+
+    return CacheEntry(
+        merged,
+        max([forecast.fetched_at] + [entry.fetched_at for entry in parts.values()]),
+        forecast.stale or any(entry.stale for entry in parts.values()),
+    )
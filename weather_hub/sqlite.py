@@ -0,0 +1,41 @@
+"""Per-thread SQLite connections for the stores shared between processes
+
+The forecast cache (``cache.SQLiteBackend``) and the rate limiter's bucket
+(``ratelimit.SQLiteStore``) both keep state in a file that every process on
+the host opens. sqlite3 connections must not be shared between threads, so
+each thread gets its own, opened on first use in WAL mode, where readers do
+not block the single writer.
+"""
+import os
+import sqlite3
+import threading
+
+
+class ThreadConnections:
+    """One connection to ``path`` per thread
+
+    ``isolation_level`` is passed to ``sqlite3.connect`` (``None`` for
+    autocommit, when the caller issues BEGIN/COMMIT itself); ``pragmas`` are
+    extra ``PRAGMA name=value`` settings for every new connection.
+    """
+
+    def __init__(self, path, isolation_level="", timeout=5.0, **pragmas):
+        self.path = path
+        self.isolation_level = isolation_level
+        self.timeout = timeout
+        self.pragmas = pragmas
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self):
+        """This thread's connection, opened on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=self.isolation_level)
+            conn.execute("PRAGMA journal_mode=WAL")
+            for name, value in self.pragmas.items():
+                conn.execute(f"PRAGMA {name}={value}")
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,201 @@
+"""Background refresh of forecast cache entries before they expire
+
+The scheduler keeps configured cities and the most requested locations fresh,
+for every data source a page reads, so that visitors under steady traffic
+are always served from the cache.
+"""
+import logging
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import config
+from .cache import coord_key, forecast_cache
+from .forecast import chunk_coordinates, forecast_key, refresh_forecasts
+from .sources import SOURCES, refresh_source, source_key
+
+logger = logging.getLogger(__name__)
+
+
+class PopularityTracker:
+    """Exponentially decayed request counts per location"""
+
+    def __init__(self, half_life=None):
+        self.half_life = config.POPULARITY_HALF_LIFE if half_life is None else half_life
+        self._scores = {}
+        self._lock = threading.Lock()
+
+    def _decayed(self, score, updated_at, now):
+        return score * math.pow(0.5, (now - updated_at) / self.half_life)
+
+    def record(self, lat, lon):
+        """Count one request for the location"""
+        key = coord_key(lat, lon)
+        now = time.monotonic()
+        with self._lock:
+            score, updated_at, _ = self._scores.get(key, (0.0, now, None))
+            self._scores[key] = (self._decayed(score, updated_at, now) + 1.0, now, (lat, lon))
+
+    def top(self, n=None, min_score=None):
+        """Coordinates of the ``n`` most popular locations, best first"""
+        n = config.POPULAR_TOP_N if n is None else n
+        min_score = config.POPULARITY_MIN_SCORE if min_score is None else min_score
+        now = time.monotonic()
+        with self._lock:
+            scored = []
+            for key, (score, updated_at, coords) in list(self._scores.items()):
+                score = self._decayed(score, updated_at, now)
+                if score < min_score:
+                    # Forgotten locations stop being refreshed
+                    del self._scores[key]
+                    continue
+                scored.append((score, coords))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [coords for _, coords in scored[:n]]
+
+    def score(self, lat, lon):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._scores.get(coord_key(lat, lon))
+        return 0.0 if entry is None else self._decayed(entry[0], entry[1], now)
+
+
+class RefreshScheduler:
+    """Re-fetches tracked locations shortly before their cache entries expire
+
+    Each (source, location) entry gets its own random refresh lead in
+    ``[lead, lead + jitter]`` so refreshes spread out instead of firing
+    together, and at most ``max_concurrency`` upstream calls run at once.
+    ``plan`` maps source names ("forecast" and keys of sources.SOURCES) to
+    the RequestSpecs visitors' pages request, so the entries kept fresh are
+    every one a page reads. Forecasts are refreshed in batched calls, the
+    other sources one location per call.
+    """
+
+    def __init__(self, coords=(), tracker=None, cache=None, lead=None, jitter=None,
+                 interval=None, max_concurrency=None, plan=None):
+        self.static_coords = list(coords)
+        self.plan = dict(plan or {"forecast": None})
+        unknown = sorted(set(self.plan) - {"forecast"} - set(SOURCES))
+        if unknown:
+            raise ValueError(f"Unknown data source(s) {unknown}; expected one of {sorted(SOURCES)}")
+        self.tracker = tracker if tracker is not None else popularity
+        self.cache = cache if cache is not None else forecast_cache
+        self.lead = config.REFRESH_LEAD if lead is None else lead
+        self.jitter = config.REFRESH_JITTER if jitter is None else jitter
+        self.interval = config.REFRESH_INTERVAL if interval is None else interval
+        self.max_concurrency = max_concurrency or config.REFRESH_CONCURRENCY
+
+        self._leads = {}
+        self._retry_at = {}
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+
+    def _lead_for(self, key):
+        lead = self._leads.get(key)
+        if lead is None:
+            lead = self._leads[key] = self.lead + random.uniform(0, self.jitter)
+        return lead
+
+    def _key(self, name, lat, lon):
+        spec = self.plan[name]
+        if name == "forecast":
+            return forecast_key(lat, lon, spec)
+        return source_key(SOURCES[name], lat, lon, spec)
+
+    def tracked(self):
+        """Configured plus popular coordinates, as ``{cache key: (source name, coords)}``"""
+        unique = {}
+        for lat, lon in self.static_coords + self.tracker.top():
+            for name in self.plan:
+                unique.setdefault(self._key(name, lat, lon), (name, (lat, lon)))
+        return unique
+
+    def due(self):
+        """(source name, coords) of tracked entries that are missing or about to expire"""
+        now = time.monotonic()
+        tracked = self.tracked()
+        with self._lock:
+            candidates = {
+                key: (item, self._lead_for(key)) for key, item in tracked.items()
+                if key not in self._in_flight and self._retry_at.get(key, 0) <= now
+            }
+        # Outside the lock: with the SQLite backend this reaches the database
+        remaining = {key: self.cache.expires_in(key) for key in candidates}
+        due = []
+        with self._lock:
+            for key, (item, lead) in candidates.items():
+                # Another caller may have claimed it meanwhile
+                if key in self._in_flight:
+                    continue
+                if remaining[key] is None or remaining[key] <= lead:
+                    due.append(item)
+                    self._in_flight.add(key)
+        return due
+
+    def _refresh(self, name, chunk):
+        keys = [self._key(name, lat, lon) for lat, lon in chunk]
+        try:
+            if name == "forecast":
+                refresh_forecasts(chunk, spec=self.plan[name])
+            else:
+                for lat, lon in chunk:
+                    refresh_source(SOURCES[name], lat, lon, self.plan[name])
+        except Exception:
+            logger.warning("Background refresh of %d %s location(s) failed", len(chunk), name, exc_info=True)
+            retry_at = time.monotonic() + config.REFRESH_FAILURE_BACKOFF
+            with self._lock:
+                for key in keys:
+                    self._retry_at[key] = retry_at
+        else:
+            with self._lock:
+                for key in keys:
+                    self._retry_at.pop(key, None)
+                    # Draw a fresh lead so the next round stays spread out
+                    self._leads.pop(key, None)
+        finally:
+            with self._lock:
+                self._in_flight.difference_update(keys)
+
+    def run_once(self):
+        """Submit refreshes for every due entry; returns the batch count"""
+        due = self.due()
+        forecasts = [coords for name, coords in due if name == "forecast"]
+        batches = [("forecast", chunk) for chunk in chunk_coordinates(forecasts, spec=self.plan.get("forecast"))]
+        batches += [(name, [coords]) for name, coords in due if name != "forecast"]
+        for name, chunk in batches:
+            self._executor.submit(self._refresh, name, chunk)
+        return len(batches)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Refresh scheduler tick failed")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="forecast-refresh"
+        )
+        self._thread = threading.Thread(target=self._run, name="refresh-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+popularity = PopularityTracker()